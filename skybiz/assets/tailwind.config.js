@@ -0,0 +1,20 @@
+// Tailwind v3 config for the standalone CLI, see `manage.py build_assets`.
+// Keep the theme in sync with the CDN fallback in templates/base.html.
+module.exports = {
+  darkMode: 'class',
+  content: [
+    './templates/**/*.html',
+    './static/js/**/*.js',
+    './internet/**/*.py',
+  ],
+  theme: {
+    extend: {
+      colors: {
+        primary: '#000d1d',
+        secondary: '#afbcdf',
+        'dark-primary': '#ffffff',
+        'dark-sefaceary': '#2b4676ff',
+      },
+    },
+  },
+}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Package, UserProfile, ContactMessage, BusinessQuoteRequest, SpeedTestResult
+from .models import Package, UserProfile, ContactMessage, BusinessQuoteRequest, SpeedTestResult, WhatsAppOutbox
 
 # Register your models here.
 admin.site.register(Package)
@@ -7,4 +7,5 @@ admin.site.register(UserProfile)
 admin.site.register(ContactMessage)
 admin.site.register(BusinessQuoteRequest)
 admin.site.register(SpeedTestResult)
+admin.site.register(WhatsAppOutbox)
 # admin.site.register(CarouselImage)
\ No newline at end of file
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.db.models import Q
+
+from .models import Package, ContactMessage, BusinessQuoteRequest, SpeedTestResult, Branch, NewsTicker
+
+PAGE_SIZE = 25
+
+
+class Section:
+    """One lazily loaded table of the admin panel.
+
+    Rows are returned newest first and paged by keyset on (order_field, id)
+    so deep pages cost the same as the first one.
+    """
+
+    def __init__(self, queryset, order_field, template):
+        self.queryset = queryset
+        self.order_field = order_field
+        self.template = template
+
+    def page(self, cursor=None, page_size=None):
+        page_size = page_size or PAGE_SIZE
+        qs = self.queryset().order_by(f'-{self.order_field}', '-id')
+        if cursor:
+            value, pk = cursor
+            qs = qs.filter(
+                Q(**{f'{self.order_field}__lt': value})
+                | Q(**{self.order_field: value, 'id__lt': pk})
+            )
+        rows = list(qs[:page_size + 1])
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = encode_cursor(getattr(last, self.order_field), last.id)
+        return rows, next_cursor
+
+
+def encode_cursor(value, pk):
+    return f'{value.isoformat()}|{pk}'
+
+
+def decode_cursor(cursor):
+    """Parse a cursor from encode_cursor(); raises ValueError when invalid."""
+    value, pk = cursor.rsplit('|', 1)
+    return datetime.fromisoformat(value), int(pk)
+
+
+SECTIONS = {
+    'news': Section(
+        lambda: NewsTicker.objects.only('id', 'message', 'starts_at', 'ends_at', 'created_at'),
+        'created_at', 'admin_sections/news.html',
+    ),
+    'branches': Section(
+        lambda: Branch.objects.all(),
+        'created_at', 'admin_sections/branches.html',
+    ),
+    'users': Section(
+        lambda: User.objects.only('id', 'username', 'email', 'is_superuser', 'is_active', 'date_joined'),
+        'date_joined', 'admin_sections/users.html',
+    ),
+    'packages': Section(
+        lambda: Package.objects.only(
+            'id', 'name', 'package_type', 'download_speed', 'upload_speed',
+            'price', 'data_limit', 'features', 'is_popular', 'created_at',
+        ),
+        'created_at', 'admin_sections/packages.html',
+    ),
+    'messages': Section(
+        lambda: ContactMessage.objects.only('id', 'name', 'email', 'subject', 'message', 'reply_sent', 'created_at'),
+        'created_at', 'admin_sections/messages.html',
+    ),
+    'business_requests': Section(
+        lambda: BusinessQuoteRequest.objects.only(
+            'id', 'company_name', 'contact_person', 'email', 'bandwidth', 'requirements', 'created_at',
+        ),
+        'created_at', 'admin_sections/business_requests.html',
+    ),
+    'speed_tests': Section(
+        lambda: SpeedTestResult.objects.select_related('user').only(
+            'id', 'user__username', 'download_speed', 'upload_speed', 'latency', 'ip_address', 'timestamp',
+        ),
+        'timestamp', 'admin_sections/speed_tests.html',
+    ),
+}
@@ -0,0 +1,309 @@
+"""Percentiles and histograms of speed test results.
+
+Means hide the slow tail customers complain about, so this reports
+p50/p90/p99 and a histogram of download, upload or latency over any time
+window, for the whole window or per day, hour of day or user.
+
+Rows are streamed in chunks of CHUNK_SIZE, archived segments (see
+archive.py) first and then the database by keyset on the timestamp index,
+and each chunk is folded into a Sketch with vectorized NumPy operations.
+A Sketch keeps, per group, counts over SKETCH_BINS log-spaced buckets, so
+memory depends on the number of groups, not rows, and any percentile is
+within about 1.6% of the exact value. Sketches merge by addition, which
+is how the overall figures are computed from the groups.
+
+numpy is imported on first use; it is only needed here.
+"""
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import archive
+from .models import SpeedTestResult
+
+CHUNK_SIZE = 50_000
+METRICS = ('download_speed', 'upload_speed', 'latency')
+GROUPS = ('all', 'day', 'hour', 'user')
+PERCENTILES = (50, 90, 99)
+USER_LIMIT = 50
+# Per user, everyone else's tests (anonymous ones too) are counted under this key
+OTHER_USERS = -2
+
+# Buckets grow by 3.2% from 0.01 to 100,000 (Mbps or ms)
+SKETCH_LOW = 0.01
+SKETCH_HIGH = 100_000
+SKETCH_BINS = 512
+
+# Reported histogram bucket lower bounds; the last bucket is open ended
+HISTOGRAM_EDGES = {
+    'download_speed': [0, 1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000],
+    'upload_speed': [0, 1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000],
+    'latency': [0, 5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 500, 1000],
+}
+
+
+def _numpy():
+    import numpy
+    return numpy
+
+
+class Sketch:
+    """Mergeable per-group bucket counts, sums, minimums and maximums."""
+
+    def __init__(self, histogram_edges, capacity=16):
+        np = _numpy()
+        self.edges = np.geomspace(SKETCH_LOW, SKETCH_HIGH, SKETCH_BINS)
+        self.histogram_edges = np.asarray(histogram_edges, dtype=float)
+        self.keys = {}
+        # Slot 0 is below SKETCH_LOW, slot SKETCH_BINS at or above SKETCH_HIGH
+        self.counts = np.zeros((capacity, SKETCH_BINS + 1), dtype=np.int64)
+        self.histograms = np.zeros((capacity, len(self.histogram_edges)), dtype=np.int64)
+        self.sums = np.zeros(capacity)
+        self.mins = np.full(capacity, np.inf)
+        self.maxs = np.full(capacity, -np.inf)
+
+    def _grow(self):
+        np = _numpy()
+        extra = len(self.sums)
+        self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+        self.histograms = np.concatenate([self.histograms, np.zeros_like(self.histograms)])
+        self.sums = np.concatenate([self.sums, np.zeros(extra)])
+        self.mins = np.concatenate([self.mins, np.full(extra, np.inf)])
+        self.maxs = np.concatenate([self.maxs, np.full(extra, -np.inf)])
+
+    def _row(self, key):
+        row = self.keys.get(key)
+        if row is None:
+            row = self.keys[key] = len(self.keys)
+            if row == len(self.sums):
+                self._grow()
+        return row
+
+    def add(self, keys, values):
+        """Count ``values`` into the groups named by ``keys`` (equal length arrays)."""
+        np = _numpy()
+        if not len(values):
+            return
+        unique, inverse = np.unique(keys, return_inverse=True)
+        rows = np.array([self._row(key) for key in unique.tolist()], dtype=np.int64)[inverse]
+        groups = len(self.keys)
+        slots = np.searchsorted(self.edges, values, side='right')
+        self.counts[:groups] += np.bincount(
+            rows * (SKETCH_BINS + 1) + slots, minlength=groups * (SKETCH_BINS + 1),
+        ).reshape(groups, -1)
+        buckets = np.searchsorted(self.histogram_edges, values, side='right') - 1
+        width = len(self.histogram_edges)
+        self.histograms[:groups] += np.bincount(
+            rows * width + np.maximum(buckets, 0), minlength=groups * width,
+        ).reshape(groups, -1)
+        self.sums[:groups] += np.bincount(rows, weights=values, minlength=groups)
+        np.minimum.at(self.mins, rows, values)
+        np.maximum.at(self.maxs, rows, values)
+
+    def percentile(self, counts, q, low, high):
+        """Estimate the ``q``th percentile from one row of bucket ``counts``."""
+        np = _numpy()
+        cumulative = np.cumsum(counts)
+        target = max(q / 100 * cumulative[-1], 1)
+        slot = int(np.searchsorted(cumulative, target))
+        below = cumulative[slot - 1] if slot else 0
+        fraction = (target - below) / counts[slot]
+        lower = self.edges[slot - 1] if slot else 0.0
+        upper = self.edges[slot] if slot < SKETCH_BINS else high
+        if slot and slot < SKETCH_BINS:
+            value = lower * (upper / lower) ** fraction
+        else:
+            value = lower + (upper - lower) * fraction
+        return float(min(max(value, low), high))
+
+    def empty(self):
+        return {
+            'count': 0, 'mean': None, 'min': None, 'max': None,
+            **{f'p{q}': None for q in PERCENTILES}, 'histogram': [0] * len(self.histogram_edges),
+        }
+
+    def summary(self, row=None):
+        """Stats for one group, or for all of them merged when ``row`` is None."""
+        groups = len(self.keys)
+        if row is None:
+            counts = self.counts[:groups].sum(axis=0)
+            histogram = self.histograms[:groups].sum(axis=0)
+            total = self.sums[:groups].sum()
+            low, high = self.mins[:groups].min(initial=float('inf')), self.maxs[:groups].max(initial=float('-inf'))
+        else:
+            counts, histogram = self.counts[row], self.histograms[row]
+            total, low, high = self.sums[row], self.mins[row], self.maxs[row]
+        count = int(counts.sum())
+        if not count:
+            return self.empty()
+        return {
+            'count': count,
+            'mean': round(float(total) / count, 2),
+            'min': round(float(low), 2),
+            'max': round(float(high), 2),
+            **{f'p{q}': round(self.percentile(counts, q, low, high), 2) for q in PERCENTILES},
+            'histogram': histogram.tolist(),
+        }
+
+
+def _local_offsets(timestamps):
+    # UTC offset of each timestamp in the current time zone, looked up once per hour
+    np = _numpy()
+    tz = timezone.get_current_timezone()
+    hours, inverse = np.unique(timestamps // 3600, return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(hour * 3600, dt_timezone.utc).astimezone(tz).utcoffset().total_seconds()
+        for hour in hours.tolist()
+    ])
+    return offsets[inverse]
+
+
+def _group_keys(group, timestamps):
+    np = _numpy()
+    if group == 'all':
+        return np.zeros(len(timestamps), dtype=np.int64)
+    local = timestamps + _local_offsets(timestamps)
+    if group == 'day':
+        return (local // 86400).astype(np.int64)
+    return ((local // 3600) % 24).astype(np.int64)
+
+
+def _archived(start, end, columns):
+    """Yield ({column: values}, in-window mask) for each archive segment
+    that may hold tests between ``start`` and ``end``.
+
+    Re-imported months are no longer in the archive (see archive.reimport),
+    so nothing yielded here is also in the table.
+    """
+    np = _numpy()
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    # Archive partitions are UTC months
+    first, last = (moment.astimezone(dt_timezone.utc).strftime('%Y-%m') for moment in (start, end))
+    for month in archive.partitions():
+        if not first <= month <= last:
+            continue
+        for path in archive.segments(month):
+            data = archive.read_segment(path, columns)
+            timestamps = np.frombuffer(data['timestamp'], dtype=np.float64)
+            yield data, (timestamps >= start_ts) & (timestamps < end_ts)
+
+
+def chunks(metric, start, end, user_ids=None, chunk_size=CHUNK_SIZE):
+    """Yield (timestamps, user ids, values) arrays for ``start`` <= timestamp < ``end``.
+
+    Timestamps are epoch seconds; anonymous tests have user id
+    archive.NULL_ID. Only ``user_ids`` are included when given.
+    """
+    np = _numpy()
+    wanted = np.array(user_ids, dtype=np.int64) if user_ids is not None else None
+    for data, mask in _archived(start, end, ('timestamp', 'user_id', metric)):
+        timestamps = np.frombuffer(data['timestamp'], dtype=np.float64)
+        users = np.frombuffer(data['user_id'], dtype=np.int64)
+        if wanted is not None:
+            mask &= np.isin(users, wanted)
+        yield timestamps[mask], users[mask], np.frombuffer(data[metric], dtype=np.float64)[mask]
+
+    queryset = SpeedTestResult.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    queryset = queryset.order_by('-timestamp', '-id').values_list('timestamp', 'id', 'user_id', metric)
+    cursor = None
+    while True:
+        page = queryset
+        if cursor:
+            page = page.filter(Q(timestamp__lt=cursor[0]) | Q(timestamp=cursor[0], id__lt=cursor[1]))
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        cursor = rows[-1][:2]
+        yield (
+            np.fromiter((row[0].timestamp() for row in rows), dtype=np.float64, count=len(rows)),
+            np.fromiter((archive.NULL_ID if row[2] is None else row[2] for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows)),
+        )
+
+
+def window(start_day, end_day):
+    """Datetimes from local midnight of ``start_day`` to the midnight after ``end_day``."""
+    return (
+        timezone.make_aware(datetime.combine(start_day, time())),
+        timezone.make_aware(datetime.combine(end_day + timedelta(days=1), time())),
+    )
+
+
+def top_users(start, end, limit=USER_LIMIT):
+    """Ids of the users with the most tests in the window, busiest first.
+
+    Counts archived tests too, so the users picked are the busiest over
+    the same rows percentiles() reads.
+    """
+    np = _numpy()
+    tests = dict(
+        SpeedTestResult.objects.filter(timestamp__gte=start, timestamp__lt=end, user__isnull=False)
+        .values('user_id').annotate(tests=Count('id')).values_list('user_id', 'tests')
+    )
+    for data, mask in _archived(start, end, ('timestamp', 'user_id')):
+        users = np.frombuffer(data['user_id'], dtype=np.int64)[mask]
+        ids, counts = np.unique(users[users != archive.NULL_ID], return_counts=True)
+        for user_id, count in zip(ids.tolist(), counts.tolist()):
+            tests[user_id] = tests.get(user_id, 0) + count
+    return sorted(tests, key=lambda user_id: (-tests[user_id], user_id))[:limit]
+
+
+def percentiles(metric, start_day, end_day, group='day', user_ids=None, limit=USER_LIMIT, chunk_size=CHUNK_SIZE):
+    """p50/p90/p99, mean, range and histogram of ``metric`` per group.
+
+    ``group`` is 'all', 'day', 'hour' (of the day, local time) or 'user';
+    per user only the ``limit`` busiest users in the window are reported
+    unless ``user_ids`` are given. 'overall' covers every test the groups
+    are drawn from, and per user every test in the window, listed user or
+    not, so the distribution doesn't change with the grouping.
+    """
+    if metric not in METRICS:
+        raise ValueError(f'Unknown metric {metric}')
+    if group not in GROUPS:
+        raise ValueError(f'Unknown grouping {group}')
+    start, end = window(start_day, end_day)
+    if group == 'user' and user_ids is None:
+        user_ids = top_users(start, end, limit)
+
+    np = _numpy()
+    sketch = Sketch(HISTOGRAM_EDGES[metric])
+    if group == 'user':
+        listed = np.array(user_ids, dtype=np.int64)
+        for timestamps, users, values in chunks(metric, start, end, chunk_size=chunk_size):
+            sketch.add(np.where(np.isin(users, listed), users, OTHER_USERS), values)
+    else:
+        for timestamps, users, values in chunks(metric, start, end, user_ids, chunk_size):
+            sketch.add(_group_keys(group, timestamps), values)
+
+    if group == 'day':
+        epoch = date(1970, 1, 1)
+        keys = [(start_day + timedelta(days=i) - epoch).days for i in range((end_day - start_day).days + 1)]
+        labels = [(epoch + timedelta(days=key)).isoformat() for key in keys]
+    elif group == 'hour':
+        keys = list(range(24))
+        labels = [f'{hour:02d}:00' for hour in keys]
+    elif group == 'user':
+        keys = list(user_ids)
+        names = dict(User.objects.filter(id__in=keys).values_list('id', 'username'))
+        labels = [names.get(key, f'user {key}') for key in keys]
+    else:
+        keys, labels = [0], ['all']
+
+    groups = []
+    for key, label in zip(keys, labels):
+        row = sketch.keys.get(key)
+        groups.append({'key': label, **(sketch.summary(row) if row is not None else sketch.empty())})
+    return {
+        'metric': metric,
+        'group': group,
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'percentiles': list(PERCENTILES),
+        'histogram_edges': HISTOGRAM_EDGES[metric],
+        'overall': sketch.summary(),
+        'groups': groups,
+    }
@@ -0,0 +1,254 @@
+"""Cold storage for old SpeedTestResult rows.
+
+Rows are moved out of the database into write-once segment files, one
+directory per month::
+
+    SPEEDTEST_ARCHIVE_DIR/2025-01/segment-00000001-00050000.col
+
+A segment stores each column separately, zlib compressed, behind a small
+JSON header, so readers only decompress the columns they ask for and never
+hold more than one segment in memory.
+"""
+import json
+import os
+import struct
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from . import purge
+from .models import SpeedTestResult
+
+MAGIC = b'SKYARC1\n'
+SEGMENT_ROWS = 50_000
+
+# column name -> array typecode, or None for strings
+COLUMNS = {
+    'id': 'q',
+    'timestamp': 'd',
+    'user_id': 'q',
+    'download_speed': 'd',
+    'upload_speed': 'd',
+    'latency': 'd',
+    'ip_address': None,
+}
+NULL_ID = -1
+
+
+def archive_dir():
+    return settings.SPEEDTEST_ARCHIVE_DIR
+
+
+def _encode(typecode, values):
+    if typecode is None:
+        data = json.dumps(values, separators=(',', ':')).encode()
+    else:
+        data = array(typecode, values).tobytes()
+    return zlib.compress(data, 6)
+
+
+def _decode(typecode, data):
+    data = zlib.decompress(data)
+    if typecode is None:
+        return json.loads(data)
+    values = array(typecode)
+    values.frombytes(data)
+    return values
+
+
+def write_segment(path, rows):
+    """Write ``rows`` (dicts keyed by COLUMNS) to a new segment file.
+
+    The file is written under a temporary name and renamed into place, so
+    readers never see a half written segment. Existing segments are never
+    rewritten.
+    """
+    columns = {}
+    for name, typecode in COLUMNS.items():
+        columns[name] = _encode(typecode, [row[name] for row in rows])
+    header = json.dumps({
+        'rows': len(rows),
+        'columns': [[name, len(data)] for name, data in columns.items()],
+    }).encode()
+
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for data in columns.values():
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_segment(path, columns=None):
+    """Return {column: values} for the requested columns of one segment."""
+    wanted = set(columns or COLUMNS)
+    result = {}
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a speed test archive segment')
+        (header_len,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len))
+        for name, length in header['columns']:
+            if name in wanted:
+                result[name] = _decode(COLUMNS[name], f.read(length))
+            else:
+                f.seek(length, os.SEEK_CUR)
+    return result
+
+
+def partitions():
+    root = archive_dir()
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+
+
+def segments(month):
+    folder = os.path.join(archive_dir(), month)
+    return [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.endswith('.col')
+    ]
+
+
+def read_rows(start=None, end=None, columns=None):
+    """Stream archived rows as dicts, oldest partition first.
+
+    ``start``/``end`` are optional datetimes; only one segment is held in
+    memory at a time.
+    """
+    columns = list(columns or COLUMNS)
+    first = start.strftime('%Y-%m') if start else None
+    last = end.strftime('%Y-%m') if end else None
+    start_ts = start.timestamp() if start else None
+    end_ts = end.timestamp() if end else None
+    for month in partitions():
+        if (first and month < first) or (last and month > last):
+            continue
+        for path in segments(month):
+            yield from _segment_rows(path, columns, start_ts, end_ts)
+
+
+def _segment_rows(path, columns, start_ts=None, end_ts=None):
+    data = read_segment(path, set(columns) | {'timestamp'})
+    for i, ts in enumerate(data['timestamp']):
+        if (start_ts is not None and ts < start_ts) or (end_ts is not None and ts >= end_ts):
+            continue
+        row = {name: data[name][i] for name in columns}
+        if 'timestamp' in row:
+            row['timestamp'] = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+        if row.get('user_id') == NULL_ID:
+            row['user_id'] = None
+        yield row
+
+def _row(result):
+    return {
+        'id': result['id'],
+        'timestamp': result['timestamp'].timestamp(),
+        'user_id': result['user_id'] if result['user_id'] is not None else NULL_ID,
+        'download_speed': result['download_speed'],
+        'upload_speed': result['upload_speed'],
+        'latency': result['latency'],
+        'ip_address': result['ip_address'],
+    }
+
+
+def archive_before(cutoff, segment_rows=SEGMENT_ROWS, progress=None):
+    """Move every SpeedTestResult older than ``cutoff`` into the archive.
+
+    Works through the table in primary key chunks: each chunk is written
+    to one segment per month it touches and then deleted from the
+    database. Returns the number of rows archived.
+    """
+    archived = 0
+    queryset = SpeedTestResult.objects.filter(timestamp__lt=cutoff).order_by('pk')
+    while True:
+        chunk = list(queryset.values(*COLUMNS)[:segment_rows])
+        if not chunk:
+            break
+        by_month = {}
+        for result in chunk:
+            month = timezone.localtime(result['timestamp'], dt_timezone.utc).strftime('%Y-%m')
+            by_month.setdefault(month, []).append(_row(result))
+        for month, rows in by_month.items():
+            folder = os.path.join(archive_dir(), month)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f"segment-{rows[0]['id']:08d}-{rows[-1]['id']:08d}.col")
+            # A rerun after a crash picks the same chunk again; the segment
+            # is already on disk, only the delete is left to do
+            if not os.path.exists(path):
+                write_segment(path, rows)
+        # Archived tests stay in the rollups, so the dashboard keeps their history
+        purge.purge(SpeedTestResult.objects.filter(pk__in=[r['id'] for r in chunk]), update_rollups=False)
+        archived += len(chunk)
+        if progress:
+            progress(archived)
+    return archived
+
+
+def archive_older_than(days=None, **kwargs):
+    if days is None:
+        days = settings.SPEEDTEST_ARCHIVE_AFTER_DAYS
+    return archive_before(timezone.now() - timedelta(days=days), **kwargs)
+
+
+class _RawInsertQuerySet(QuerySet):
+    """bulk_create() that stores timestamps as given.
+
+    A raw insert takes each field's value off the instance instead of
+    calling pre_save(), which would stamp auto_now_add fields with the
+    current time; loaddata keeps fixture timestamps the same way. Unlike
+    switching auto_now_add off on the field, this only affects this
+    queryset's inserts, not other threads creating results meanwhile.
+    """
+
+    def _insert(self, *args, **kwargs):
+        return super()._insert(*args, **{**kwargs, 'raw': True})
+
+
+def month_range(month):
+    """(start, end) datetimes of a 'YYYY-MM' partition."""
+    start = datetime.strptime(month, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def reimport(month, batch_size=1000):
+    """Move one archived month back into the database. Returns rows read.
+
+    Each segment is deleted once its rows are committed, and the month's
+    directory once it is empty, so readers that combine the archive with
+    the table never see a re-imported row twice. A rerun after a crash
+    picks up the remaining segments; rows already back are skipped.
+    """
+    folder = os.path.join(archive_dir(), month)
+    if not os.path.isdir(folder):
+        return 0
+    count = 0
+    queryset = _RawInsertQuerySet(SpeedTestResult)
+    for path in segments(month):
+        batch = []
+        for row in _segment_rows(path, COLUMNS):
+            batch.append(SpeedTestResult(**row))
+            if len(batch) >= batch_size:
+                with transaction.atomic():
+                    queryset.bulk_create(batch, ignore_conflicts=True)
+                count += len(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                queryset.bulk_create(batch, ignore_conflicts=True)
+            count += len(batch)
+        os.remove(path)
+    if not os.listdir(folder):
+        os.rmdir(folder)
+    return count
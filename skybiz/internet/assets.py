@@ -0,0 +1,161 @@
+"""Build-time static assets.
+
+build_assets compiles Tailwind with the standalone CLI into
+static/build/app.css, keeping only the classes used in templates/, and
+vendors Chart.js into static/vendor/. collectstatic then fingerprints
+every file through the manifest storage below and writes .gz (and .br
+when brotli is installed) next to each text asset. serve() answers
+/static/ with the best precompressed variant and a far-future immutable
+Cache-Control on fingerprinted names.
+
+Until the assets are built, base.html falls back to the CDN scripts (see
+the asset_available tag).
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+import shutil
+import subprocess
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+
+from .encoding import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CSS_OUTPUT = 'build/app.css'
+CHARTJS_VERSION = '4.4.1'
+CHARTJS_URL = f'https://cdn.jsdelivr.net/npm/chart.js@{CHARTJS_VERSION}/dist/chart.umd.min.js'
+CHARTJS_OUTPUT = 'vendor/chart.umd.min.js'
+
+COMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MUTABLE_MAX_AGE = 60
+
+_available = {}
+
+
+def _static_dir():
+    return settings.STATICFILES_DIRS[0]
+
+
+def tailwind_cli():
+    cli = settings.TAILWIND_CLI
+    return cli if os.path.isfile(cli) else shutil.which(cli)
+
+
+def build_css(minify=True):
+    """Compile the purged stylesheet; returns its size in bytes."""
+    cli = tailwind_cli()
+    if cli is None:
+        raise FileNotFoundError(settings.TAILWIND_CLI)
+    output = os.path.join(_static_dir(), CSS_OUTPUT)
+    args = [
+        cli,
+        '--config', os.path.join(settings.ASSETS_DIR, 'tailwind.config.js'),
+        '--input', os.path.join(settings.ASSETS_DIR, 'tailwind.css'),
+        '--output', output,
+    ]
+    if minify:
+        args.append('--minify')
+    # Content globs in the config are relative to the project directory
+    subprocess.run(args, cwd=settings.BASE_DIR, check=True, capture_output=True)
+    return os.path.getsize(output)
+
+
+def vendor_chartjs(refresh=False):
+    """Download the pinned Chart.js build unless it is already vendored."""
+    import urllib.request
+
+    output = os.path.join(_static_dir(), CHARTJS_OUTPUT)
+    if os.path.exists(output) and not refresh:
+        return False
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with urllib.request.urlopen(CHARTJS_URL, timeout=30) as response:
+        body = response.read()
+    with open(output + '.tmp', 'wb') as f:
+        f.write(body)
+    os.replace(output + '.tmp', output)
+    return True
+
+
+def available(path):
+    """Whether a built or vendored asset exists, so templates can fall back."""
+    if settings.DEBUG or path not in _available:
+        _available[path] = finders.find(path) is not None
+    return _available[path]
+
+
+def compress(path):
+    """Write .gz and .br siblings of ``path`` when they are smaller."""
+    with open(path, 'rb') as f:
+        body = f.read()
+    variants = {'.gz': gzip.compress(body, 9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(body)
+    written = []
+    for suffix, data in variants.items():
+        if len(data) < len(body):
+            with open(path + suffix, 'wb') as f:
+                f.write(data)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also precompresses the fingerprinted files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESS_EXTENSIONS):
+                compress(self.path(name))
+
+
+@lru_cache(maxsize=1)
+def _fingerprinted():
+    hashed = getattr(staticfiles_storage, 'hashed_files', None) or {}
+    return frozenset(hashed.values())
+
+
+def serve(request, path):
+    """Serve a collected static file, precompressed where the client allows."""
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full):
+        raise Http404
+
+    accepted = accepted_encodings(request)
+    served, encoding = full, None
+    for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if name in accepted and os.path.isfile(full + suffix):
+            served, encoding = full + suffix, name
+            break
+
+    content_type = mimetypes.guess_type(full)[0] or 'application/octet-stream'
+    response = FileResponse(open(served, 'rb'), content_type=content_type)
+    del response['Content-Disposition']
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if path in _fingerprinted():
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={MUTABLE_MAX_AGE}'
+    return response
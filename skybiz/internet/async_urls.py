@@ -0,0 +1,20 @@
+"""urls.py with the public read views replaced by their async versions."""
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'home': async_views.home,
+    'packages': async_views.packages,
+    'services': async_views.services,
+    'about': async_views.about,
+    'faq': async_views.faq,
+    'contact': async_views.contact,
+    'home_speed_test_status': async_views.home_speed_test_status,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,75 @@
+"""Async versions of the public read-only views, used under ASGI.
+
+async_urls.py swaps these in for their views.py counterparts. They only
+touch the database through the async ORM and the cache through its async
+API, so a worker can keep many slow clients in flight on one event loop.
+Anything that writes, or talks to Twilio, SMTP or speedtest, stays a sync
+view and Django runs it in a thread.
+
+The news ticker and user are resolved here and passed in the context so
+the context processors' sync lookups never run on the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from . import catalog, ticker, views
+from .models import Branch
+from .page_cache import page_cache
+from .speedtest_jobs import aget_job
+
+
+async def _context(request, **context):
+    context['news_ticker'] = await ticker.aget()
+    context['user'] = await request.auser()
+    return context
+
+
+@page_cache(csrf=True)
+async def home(request):
+    current = await catalog.aget()
+    return render(request, 'home.html', await _context(
+        request,
+        popular_packages=current.popular[:12],
+        speedtest_mode=settings.SPEEDTEST_MODE,
+    ))
+
+
+@page_cache
+async def packages(request):
+    current = await catalog.aget()
+    return render(request, 'packages.html', await _context(
+        request,
+        residential_packages=current.residential,
+        business_packages=current.business,
+    ))
+
+
+@page_cache
+async def services(request):
+    return render(request, 'services.html', await _context(request))
+
+
+@page_cache
+async def about(request):
+    return render(request, 'about.html', await _context(request))
+
+
+@page_cache
+async def faq(request):
+    return render(request, 'faq.html', await _context(request))
+
+
+async def contact(request):
+    if request.method == 'POST':
+        return await sync_to_async(views.contact)(request)
+    branches = [branch async for branch in Branch.objects.filter(is_active=True)]
+    return render(request, 'contact.html', await _context(request, branches=branches))
+
+
+async def home_speed_test_status(request, job_id):
+    job = await aget_job(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Unknown speed test'}, status=404)
+    return JsonResponse(job)
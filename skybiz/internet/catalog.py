@@ -0,0 +1,92 @@
+"""Per-process snapshot of the Package catalog.
+
+Public pages read packages on every hit while the catalog changes a few
+times a month. Each worker keeps an immutable snapshot tagged with the
+catalog version stored in the shared cache; saving or deleting a Package
+bumps the version (see signals.py) and every worker reloads on its next
+request. Serving a page costs one cache read and no queries.
+
+Bulk queryset updates skip model signals, so call bump() after them.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from . import metrics
+from .models import Package
+
+VERSION_KEY = 'catalog:packages:version'
+
+Catalog = namedtuple('Catalog', ['version', 'packages', 'residential', 'business', 'popular'])
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def version():
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        # Start from the clock so a cleared cache never reuses an old version
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def load(current):
+    return _build(current, tuple(Package.objects.order_by('id')))
+
+
+def _build(current, packages):
+    return Catalog(
+        version=current,
+        packages=packages,
+        residential=tuple(p for p in packages if p.package_type == 'residential'),
+        business=tuple(p for p in packages if p.package_type == 'business'),
+        popular=tuple(p for p in packages if p.is_popular),
+    )
+
+
+def get():
+    """Return the current Catalog, reloading it if another process changed it."""
+    global _snapshot
+    current = version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == current:
+        metrics.cache_lookup('catalog', True)
+        return snapshot
+    metrics.cache_lookup('catalog', False)
+    with _lock:
+        if _snapshot is None or _snapshot.version != current:
+            _snapshot = load(current)
+        return _snapshot
+
+
+async def aversion():
+    current = await cache.aget(VERSION_KEY)
+    if current is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), None)
+        current = await cache.aget(VERSION_KEY)
+    return current
+
+
+async def aget():
+    """Async get() for the ASGI views; loads through the async ORM."""
+    global _snapshot
+    current = await aversion()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == current:
+        metrics.cache_lookup('catalog', True)
+        return snapshot
+    metrics.cache_lookup('catalog', False)
+    packages = tuple([p async for p in Package.objects.order_by('id')])
+    _snapshot = _build(current, packages)
+    return _snapshot
@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import page_cache, ticker
+
+
+def news_ticker(request):
+    # Lazy, so responses that never render base.html skip the cache read
+    return {'news_ticker': SimpleLazyObject(ticker.get)}
+
+
+def page_cache_csrf(request):
+    # Pages stored by the page cache get a placeholder token, filled in per
+    # response. Listed after Django's csrf processor, so this one wins
+    if getattr(request, 'page_cache_csrf', False):
+        return {'csrf_token': page_cache.CSRF_PLACEHOLDER}
+    return {}
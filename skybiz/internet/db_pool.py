@@ -0,0 +1,51 @@
+"""Database connection reuse statistics for this worker process.
+
+With psycopg 3 the numbers come straight from the psycopg_pool pool.
+Otherwise Django keeps one persistent connection per thread
+(CONN_MAX_AGE) and we count requests and new connections ourselves via
+the signals in signals.py; there is no queue to wait in, so waits and
+timeouts stay at zero.
+"""
+import os
+import threading
+
+from django.db import connections
+
+_lock = threading.Lock()
+_counts = {'requests': 0, 'connections_opened': 0}
+
+
+def record(name):
+    with _lock:
+        _counts[name] += 1
+
+
+def stats(alias='default'):
+    connection = connections[alias]
+    result = {'pid': os.getpid(), 'vendor': connection.vendor, **_counts}
+    pool = getattr(connection, 'pool', None)
+    if pool is not None:
+        raw = pool.get_stats()
+        result.update({
+            'mode': 'pool',
+            'size': raw.get('pool_size', 0),
+            'available': raw.get('pool_available', 0),
+            'max_size': raw.get('pool_max', 0),
+            'checkouts': raw.get('requests_num', 0),
+            'waits': raw.get('requests_queued', 0),
+            'wait_ms': raw.get('requests_wait_ms', 0),
+            'timeouts': raw.get('requests_errors', 0),
+            'connections_opened': raw.get('connections_num', 0),
+            'connections_lost': raw.get('connections_lost', 0),
+        })
+        return result
+
+    max_age = connection.settings_dict.get('CONN_MAX_AGE', 0)
+    result.update({
+        'mode': 'persistent' if max_age != 0 else 'per-request',
+        'checkouts': _counts['requests'],
+        'waits': 0,
+        'wait_ms': 0,
+        'timeouts': 0,
+    })
+    return result
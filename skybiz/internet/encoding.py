@@ -0,0 +1,24 @@
+"""Content negotiation shared by the page cache and the static file server."""
+
+CODINGS = ('br', 'gzip')
+
+
+def accepted_encodings(request, codings=CODINGS):
+    """Which of ``codings`` the client accepts, from Accept-Encoding with its q-values."""
+    qualities = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = part.split(';')
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding.strip():
+            qualities[coding.strip().lower()] = q
+    return {
+        coding for coding in codings
+        if qualities.get(coding, qualities.get('*', 0)) > 0
+    }
@@ -0,0 +1,115 @@
+"""HTTP load generation for the loadtest command.
+
+Serves the site from Django's threaded WSGI server on a free local port
+and drives one URL at a time with concurrent clients (a new connection
+per request), recording latency, status codes and the per-request query
+count from the X-DB-Queries header (QUERY_BUDGET_HEADER must be on).
+"""
+import http.client
+import re
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+
+QUERY_COUNT = re.compile(r'count=(\d+)')
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve(host='127.0.0.1', port=0):
+    """Run the WSGI app in a background thread; yields (host, port)."""
+    server = ThreadedWSGIServer((host, port), QuietHandler, allow_reuse_address=False)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.server_address[:2]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def drive(address, path, requests, concurrency, headers=None):
+    """GET ``path`` ``requests`` times from ``concurrency`` threads.
+
+    Returns {'latencies': [...], 'statuses': {code: n}, 'queries': [...],
+    'errors': n, 'wall': seconds}.
+    """
+    host, port = address
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    result = {'latencies': [], 'statuses': {}, 'queries': [], 'errors': 0}
+
+    def worker():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers or {})
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    result['errors'] += 1
+                continue
+            finally:
+                connection.close()
+            elapsed = time.perf_counter() - start
+            match = QUERY_COUNT.search(response.getheader('X-DB-Queries') or '')
+            with lock:
+                result['latencies'].append(elapsed)
+                result['statuses'][response.status] = result['statuses'].get(response.status, 0) + 1
+                if match:
+                    result['queries'].append(int(match.group(1)))
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    result['wall'] = time.perf_counter() - start
+    return result
+
+
+def summarize(result):
+    latencies = result['latencies']
+    summary = {
+        'requests': len(latencies),
+        'errors': result['errors'],
+        'statuses': {str(code): n for code, n in sorted(result['statuses'].items())},
+        'throughput_rps': round(len(latencies) / result['wall'], 1) if result['wall'] else 0,
+        'latency_ms': None,
+        'queries': None,
+    }
+    if latencies:
+        summary['latency_ms'] = {
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'mean': round(statistics.mean(latencies) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2),
+        }
+    if result['queries']:
+        summary['queries'] = {
+            'mean': round(statistics.mean(result['queries']), 2),
+            'max': max(result['queries']),
+        }
+    return summary
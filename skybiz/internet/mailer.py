@@ -0,0 +1,155 @@
+"""Outgoing mail over a pooled SMTP connection, and reply jobs.
+
+Each worker keeps one SMTP connection open and sends every message through
+it, reconnecting when the server has dropped it or it sat idle too long.
+Replies to contact messages run as background jobs on a single mail
+thread; their progress is kept in the shared cache for the admin panel
+to poll, like speed test jobs.
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from smtplib import SMTPException, SMTPServerDisconnected
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.template import Context, Template
+
+from . import metrics, profiling
+from .models import ContactMessage
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'mail:job:{}'
+JOB_TTL = 60 * 60
+IDLE_TIMEOUT = 60  # servers drop idle connections; reconnect rather than find out mid-send
+PROGRESS_EVERY = 10
+MAX_ERRORS = 20
+
+
+class MailService:
+    """One reused SMTP connection. Only use it from one thread at a time."""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.connection = None
+        self.last_used = 0
+
+    def _connection(self):
+        if self.connection is not None and time.monotonic() - self.last_used > self.idle_timeout:
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        return self.connection
+
+    def send(self, message):
+        with profiling.phase('smtp'), metrics.external_call('smtp'):
+            try:
+                sent = self._connection().send_messages([message])
+            except SMTPServerDisconnected:
+                self.close()
+                sent = self._connection().send_messages([message])
+        self.last_used = time.monotonic()
+        return sent
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+_service = MailService()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mail')
+
+
+def get_job(job_id):
+    return cache.get(JOB_KEY.format(job_id))
+
+
+def _update_job(job_id, **fields):
+    job = get_job(job_id) or {'id': job_id}
+    job.update(fields)
+    job['updated_at'] = time.time()
+    cache.set(JOB_KEY.format(job_id), job, JOB_TTL)
+    return job
+
+
+def compile_reply(subject, body):
+    """Parse reply templates; raises TemplateSyntaxError for bad ones.
+
+    Templates see the message's ``name``, ``email``, ``subject`` and
+    ``message``.
+    """
+    return Template(subject), Template(body)
+
+
+def build_reply(message, subject, body):
+    context = Context({
+        'name': message.name,
+        'email': message.email,
+        'subject': message.subject,
+        'message': message.message,
+    }, autoescape=False)
+    if isinstance(subject, Template):
+        subject = subject.render(context)
+    if isinstance(body, Template):
+        body = body.render(context)
+    return EmailMessage(
+        subject=' '.join(subject.split()),
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[message.email],
+    )
+
+
+def send_replies(job_id, message_ids, subject, body, service=None):
+    """Reply to every ContactMessage in ``message_ids`` and record progress.
+
+    ``subject``/``body`` are plain strings or templates from
+    compile_reply(). Messages that were sent are marked reply_sent in one
+    update at the end. Returns the finished job.
+    """
+    service = service or _service
+    rows = list(ContactMessage.objects.filter(pk__in=message_ids).only('id', 'name', 'email', 'subject', 'message'))
+    _update_job(job_id, status='running', total=len(rows))
+    sent_ids = []
+    errors = []
+    for i, row in enumerate(rows, 1):
+        try:
+            service.send(build_reply(row, subject, body))
+            sent_ids.append(row.pk)
+        except (SMTPException, OSError) as e:
+            logger.error(f"Failed to send reply to {row.email}: {e}")
+            errors.append(f'{row.email}: {e}')
+        if i % PROGRESS_EVERY == 0:
+            _update_job(job_id, sent=len(sent_ids), failed=len(errors))
+    ContactMessage.objects.filter(pk__in=sent_ids).update(reply_sent=True)
+    logger.info(f"Reply job {job_id}: {len(sent_ids)} sent, {len(errors)} failed")
+    return _update_job(job_id, status='done', sent=len(sent_ids), failed=len(errors), errors=errors[:MAX_ERRORS])
+
+
+@profiling.track('reply job')
+def _run(job_id, message_ids, subject, body):
+    close_old_connections()
+    try:
+        send_replies(job_id, message_ids, subject, body)
+    except Exception as e:
+        logger.exception(f"Reply job {job_id} failed")
+        _update_job(job_id, status='failed', error=str(e))
+    finally:
+        close_old_connections()
+
+
+def start_replies(message_ids, subject, body):
+    """Queue a reply job on the mail thread and return its id straight away."""
+    job_id = uuid.uuid4().hex
+    _update_job(job_id, status='queued', total=len(message_ids), sent=0, failed=0, errors=[])
+    _executor.submit(_run, job_id, list(message_ids), subject, body)
+    return job_id
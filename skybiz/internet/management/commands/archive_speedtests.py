@@ -0,0 +1,46 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from internet import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Move old speed test results into compressed monthly archive files. '
+        'Also lists, exports and re-imports archived months.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, metavar='DAYS',
+                            help='Archive results older than this (default SPEEDTEST_ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--segment-rows', type=int, default=archive.SEGMENT_ROWS)
+        parser.add_argument('--list', action='store_true', help='List archived months and their row counts.')
+        parser.add_argument('--export', metavar='YYYY-MM', help='Write one archived month to stdout as CSV.')
+        parser.add_argument('--reimport', metavar='YYYY-MM', help='Copy one archived month back into the database.')
+
+    def handle(self, *args, **options):
+        month = options['export'] or options['reimport']
+        if month and month not in archive.partitions():
+            raise CommandError(f'No archive for {month}. Archived months: {", ".join(archive.partitions()) or "none"}')
+
+        if options['list']:
+            for name in archive.partitions():
+                rows = sum(len(archive.read_segment(path, ['id'])['id']) for path in archive.segments(name))
+                self.stdout.write(f'{name}: {rows} rows in {len(archive.segments(name))} segments')
+        elif options['export']:
+            writer = csv.writer(self.stdout)
+            writer.writerow(archive.COLUMNS)
+            start, end = archive.month_range(month)
+            for row in archive.read_rows(start, end):
+                writer.writerow(row.values())
+        elif options['reimport']:
+            count = archive.reimport(month)
+            self.stdout.write(self.style.SUCCESS(f'Re-imported {count} speed test results from {month}.'))
+        else:
+            count = archive.archive_older_than(
+                options['older_than'],
+                segment_rows=options['segment_rows'],
+                progress=lambda n: self.stdout.write(f'  {n} archived...'),
+            )
+            self.stdout.write(self.style.SUCCESS(f'Archived {count} speed test results.'))
@@ -0,0 +1,123 @@
+import asyncio
+import statistics
+import threading
+import time
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from internet.async_urls import ASYNC_VIEWS
+from internet.speedtest_jobs import JOB_KEY
+
+from .benchmark_db_pool import percentile
+
+URLCONFS = {'wsgi': 'internet.urls', 'asgi': 'internet.async_urls'}
+
+BENCHMARK_JOB = 'benchmark'
+
+ROUTE_KWARGS = {'home_speed_test_status': {'job_id': BENCHMARK_JOB}}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput and latency of the public read pages through the WSGI (sync views, '
+        'one thread per client) and ASGI (async views, one event loop) request handlers under '
+        'concurrent clients. Runs in process against the data already in the database, so it '
+        'measures the Django stack without a server in front of it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per handler.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Concurrent clients.')
+        parser.add_argument('--warmup', type=int, default=50, help='Untimed requests per handler first.')
+        parser.add_argument('--only', choices=sorted(URLCONFS), help='Benchmark one handler.')
+
+    def handle(self, *args, **options):
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        # A running job for the status path to poll
+        cache.set(JOB_KEY.format(BENCHMARK_JOB), {'id': BENCHMARK_JOB, 'status': 'running', 'phase': 'download'}, 3600)
+        try:
+            results = self.compare(host, options)
+        finally:
+            cache.delete(JOB_KEY.format(BENCHMARK_JOB))
+        if any(errors for _, errors, _ in results.values()):
+            raise CommandError('Some requests failed; check the pages respond with the current data.')
+
+    def compare(self, host, options):
+        results = {}
+        for name, urlconf in URLCONFS.items():
+            if options['only'] and name != options['only']:
+                continue
+            with override_settings(ROOT_URLCONF=urlconf):
+                paths = [reverse(route, kwargs=ROUTE_KWARGS.get(route)) for route in ASYNC_VIEWS]
+                run = self.run_wsgi if name == 'wsgi' else self.run_asgi
+                run(paths, host, options['warmup'], 1)
+                latencies, errors, wall = run(paths, host, options['requests'], options['concurrency'])
+            results[name] = (latencies, errors, wall)
+            self.stdout.write(
+                f'{name}  {len(latencies) / wall:8.1f} req/s  '
+                f'p50 {percentile(latencies, 50) * 1000:7.2f}ms  '
+                f'p95 {percentile(latencies, 95) * 1000:7.2f}ms  '
+                f'p99 {percentile(latencies, 99) * 1000:7.2f}ms  '
+                f'mean {statistics.mean(latencies) * 1000:7.2f}ms  errors {errors}'
+            )
+        return results
+
+    def run_wsgi(self, paths, host, requests, concurrency):
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+        counter = iter(range(requests))
+
+        def worker():
+            nonlocal errors
+            client = Client(headers={'host': host})
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                start = time.perf_counter()
+                response = client.get(paths[i % len(paths)])
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    errors += response.status_code != 200
+            connections.close_all()
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return latencies, errors, time.perf_counter() - start
+
+    def run_asgi(self, paths, host, requests, concurrency):
+        latencies = []
+        errors = 0
+        counter = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            client = AsyncClient(headers={'host': host})
+            for i in counter:
+                start = time.perf_counter()
+                # Like ASGIHandler, give each request its own thread for sync code
+                async with ThreadSensitiveContext():
+                    response = await client.get(paths[i % len(paths)])
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        async def main():
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        start = time.perf_counter()
+        asyncio.run(main())
+        return latencies, errors, time.perf_counter() - start
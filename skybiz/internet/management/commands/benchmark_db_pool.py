@@ -0,0 +1,92 @@
+import statistics
+import threading
+import time
+from copy import deepcopy
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import load_backend
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare per-request latency of a simple query with a new connection per request, '
+        'persistent connections and (with psycopg 3) the connection pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per thread.')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads, like a threaded worker.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        base = deepcopy(connections[options['database']].settings_dict)
+        base['OPTIONS'] = {k: v for k, v in base.get('OPTIONS', {}).items() if k != 'pool'}
+        pool = connections[options['database']].settings_dict.get('OPTIONS', {}).get('pool')
+
+        modes = {
+            'new connection per request': {**base, 'CONN_MAX_AGE': 0},
+            'persistent connections': {**base, 'CONN_MAX_AGE': None},
+        }
+        if base['ENGINE'] == 'django.db.backends.postgresql':
+            try:
+                import psycopg  # noqa: F401
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                self.stdout.write('Pooling needs psycopg 3 and psycopg_pool, skipping the pooled run.')
+            else:
+                modes['connection pool'] = {
+                    **base, 'CONN_MAX_AGE': 0,
+                    'OPTIONS': {**base['OPTIONS'], 'pool': pool or True},
+                }
+
+        for name, settings_dict in modes.items():
+            latencies, stats = self.run(settings_dict, options['requests'], options['threads'])
+            line = (
+                f'{name:28} p50 {percentile(latencies, 50) * 1000:6.2f}ms  '
+                f'p95 {percentile(latencies, 95) * 1000:6.2f}ms  '
+                f'mean {statistics.mean(latencies) * 1000:6.2f}ms'
+            )
+            if stats:
+                line += f'  waits {stats.get("requests_queued", 0)}  timeouts {stats.get("requests_errors", 0)}'
+            self.stdout.write(line)
+
+    def run(self, settings_dict, requests, threads):
+        backend = load_backend(settings_dict['ENGINE'])
+        alias = f'benchmark-{id(settings_dict)}'
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            connection = backend.DatabaseWrapper(deepcopy(settings_dict), alias)
+            timings = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                # What Django does around every request
+                connection.close_if_unusable_or_obsolete()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+                connection.close_if_unusable_or_obsolete()
+                timings.append(time.perf_counter() - start)
+            connection.close()
+            with lock:
+                latencies.extend(timings)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        stats = None
+        pools = getattr(backend.DatabaseWrapper, '_connection_pools', {})
+        if alias in pools:
+            stats = pools[alias].get_stats()
+            pools.pop(alias).close()
+        return latencies, stats
@@ -0,0 +1,133 @@
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Avg, Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from internet import rollups, seed
+from internet.admin_sections import SECTIONS
+from internet.models import BusinessQuoteRequest, ContactMessage, Package, SpeedTestResult, UserProfile
+from internet.scratch import Rollback, scratch_state
+
+from .benchmark_db_pool import percentile
+
+
+def dashboard_queries():
+    """The admin_dashboard queries, as the view runs them."""
+    today = timezone.localdate()
+    return {
+        'dashboard.user_counts': lambda: (
+            User.objects.count(), User.objects.filter(is_active=True).count(),
+            UserProfile.objects.filter(package__isnull=False).count(),
+        ),
+        'dashboard.package_counts': lambda: (
+            Package.objects.count(), Package.objects.filter(package_type='residential').count(),
+            Package.objects.filter(package_type='business').count(),
+        ),
+        'dashboard.recent_rows': lambda: (
+            list(ContactMessage.objects.order_by('-created_at')[:2]),
+            list(BusinessQuoteRequest.objects.order_by('-created_at')[:2]),
+            list(SpeedTestResult.objects.select_related('user').order_by('-timestamp')[:2]),
+        ),
+        'dashboard.speed_totals': rollups.totals,
+        'dashboard.chart_90_days': lambda: rollups.daily_series(today - timedelta(days=89), today),
+        # What speed_totals replaced, for scale
+        'raw.speed_totals': lambda: SpeedTestResult.objects.aggregate(
+            Count('id'), Avg('download_speed'), Avg('upload_speed'), Avg('latency'),
+        ),
+    }
+
+
+def section_queries():
+    """First and a deep (90% in) keyset page of every admin_panel section."""
+    queries = {}
+    for name, section in SECTIONS.items():
+        rows = section.queryset().count()
+        deep = (
+            section.queryset().order_by(f'-{section.order_field}', '-id')
+            .values_list(section.order_field, 'id')[rows * 9 // 10]
+            if rows else None
+        )
+        queries[f'section.{name}.first'] = lambda section=section: section.page()
+        queries[f'section.{name}.deep'] = lambda section=section, deep=deep: section.page(deep)
+    return queries
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the heaviest admin_dashboard and admin_panel queries at growing data sizes. Seeds each '
+        'scale tier in turn inside a transaction that is rolled back at the end, with throwaway caches, '
+        'so nothing is left behind. Reports the median time per query and tier.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tiers', nargs='+', choices=seed.TIERS, default=['small', 'medium', 'large'])
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs per query.')
+        parser.add_argument('--no-seed', action='store_true', help='Benchmark the data already in the database once.')
+        parser.add_argument('--output', help='Also write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        tiers = sorted(options['tiers'], key=seed.TIERS.get)
+        results = {}
+        try:
+            # Rolling back the seed does not undo the cache writes of refresh() and the page renders
+            with scratch_state(), transaction.atomic():
+                staff = User.objects.create(username='benchmark-queries-staff', is_staff=True, is_superuser=True)
+                host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+                client = Client(HTTP_HOST=host)
+                client.force_login(staff)
+                seeded = 0
+                for tier in ['current'] if options['no_seed'] else tiers:
+                    if tier != 'current':
+                        self.stdout.write(f'Seeding up to {seed.TIERS[tier]:,} speed tests...')
+                        seed.seed(seed.TIERS[tier] - seeded)
+                        seeded = seed.TIERS[tier]
+                        seed.refresh()
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                    results[tier] = self.run(client, options['runs'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'database': connection.vendor, 'runs': options['runs'], 'tiers': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+
+    def run(self, client, runs):
+        queries = {**dashboard_queries(), **section_queries()}
+        queries['view.admin_dashboard'] = lambda: self.get(client, reverse('dashboard'))
+        queries['view.admin_panel'] = lambda: self.get(client, reverse('admin_panel'))
+        timings = {}
+        for name, query in queries.items():
+            query()
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                query()
+                samples.append(time.perf_counter() - start)
+            timings[name] = {
+                'p50_ms': round(percentile(samples, 50) * 1000, 3),
+                'p95_ms': round(percentile(samples, 95) * 1000, 3),
+            }
+        return timings
+
+    def get(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+
+    def report(self, results):
+        tiers = list(results)
+        self.stdout.write(f'{"p50":32}' + ''.join(f'{tier:>12}' for tier in tiers))
+        for name in results[tiers[0]]:
+            self.stdout.write(f'{name:32}' + ''.join(f'{results[tier][name]["p50_ms"]:10.2f}ms' for tier in tiers))
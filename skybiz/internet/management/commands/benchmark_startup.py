@@ -0,0 +1,43 @@
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from internet import startup
+
+
+class Command(BaseCommand):
+    help = (
+        'Time cold starts: loading the site in a new interpreter (python -X importtime) '
+        'and running a no-op management command.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='Show this many slowest imports.')
+        parser.add_argument('--target', default='internet.urls', help='Module to import after django.setup().')
+
+    def handle(self, *args, **options):
+        walls = []
+        modules = {}
+        for _ in range(options['runs']):
+            wall, modules = startup.profile_imports(options['target'])
+            walls.append(wall)
+        self.stdout.write(
+            f'Import {options["target"]}: median {statistics.median(walls) * 1000:.0f}ms, '
+            f'best {min(walls) * 1000:.0f}ms over {options["runs"]} runs'
+        )
+
+        self.stdout.write('Slowest imports (cumulative, last run):')
+        ours = {name: times for name, times in modules.items() if name.startswith(('internet', 'skybiz'))}
+        for name, (own, cumulative) in sorted(modules.items(), key=lambda item: -item[1][1])[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f}ms  {own / 1000:7.1f}ms self  {name}')
+        self.stdout.write('Project modules:')
+        for name, (own, cumulative) in sorted(ours.items(), key=lambda item: -item[1][1]):
+            self.stdout.write(f'  {cumulative / 1000:8.1f}ms  {own / 1000:7.1f}ms self  {name}')
+
+        checks = [startup.time_command('check') for _ in range(options['runs'])]
+        self.stdout.write(f'manage.py check: median {statistics.median(checks) * 1000:.0f}ms')
+
+        heavy = startup.heavy_imports(modules)
+        if heavy:
+            raise CommandError(f'Heavy optional modules imported at startup: {", ".join(heavy)}')
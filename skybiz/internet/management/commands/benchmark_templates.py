@@ -0,0 +1,107 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.template import Template, engines
+from django.test import RequestFactory
+
+from internet import catalog
+from internet.admin_sections import SECTIONS
+from internet.models import Branch, BusinessQuoteRequest, ContactMessage, NewsTicker, SpeedTestResult
+
+from .benchmark_db_pool import percentile
+
+
+def sample_context():
+    """Data for every template's loops, read from the current database."""
+    current = catalog.get()
+    context = {
+        'popular_packages': current.popular[:12],
+        'residential_packages': current.residential,
+        'business_packages': current.business,
+        'branches': list(Branch.objects.filter(is_active=True)),
+        'items': list(NewsTicker.objects.filter(is_active=True)),
+        'recent_messages': list(ContactMessage.objects.order_by('-created_at')[:10]),
+        'recent_business_requests': list(BusinessQuoteRequest.objects.order_by('-created_at')[:10]),
+        'recent_speed_tests': list(SpeedTestResult.objects.order_by('-timestamp')[:10]),
+        'speedtest_mode': settings.SPEEDTEST_MODE,
+    }
+    sections = {section.template: section for section in SECTIONS.values()}
+    return context, sections
+
+
+class Command(BaseCommand):
+    help = (
+        'Report parse (compile) and render time for every template in templates/, slowest '
+        'render first. Renders as a staff user with data from the current database, through the '
+        'cached loader like production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=50)
+        parser.add_argument('--anonymous', action='store_true', help='Render as an anonymous visitor.')
+
+    def handle(self, *args, **options):
+        backend = engines['django']
+        engine = backend.engine
+        context, sections = sample_context()
+        request = RequestFactory().get('/')
+        if options['anonymous']:
+            request.user = AnonymousUser()
+        else:
+            request.user = User(username='benchmark', is_staff=True, is_superuser=True)
+
+        results = []
+        for name, path in self.templates():
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+            parse = []
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                Template(source, engine=engine)
+                parse.append(time.perf_counter() - start)
+
+            template = backend.get_template(name)
+            data = dict(context)
+            if name in sections:
+                data['rows'] = sections[name].page()[0]
+            render, warm, size, error = [], [], 0, None
+            try:
+                for _ in range(options['runs']):
+                    # Whole render, then again with the {% cache %} fragments filled
+                    caches['fragments'].clear()
+                    start = time.perf_counter()
+                    size = len(template.render(data, request))
+                    render.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    template.render(data, request)
+                    warm.append(time.perf_counter() - start)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            results.append((name, parse, render, warm, size, error))
+
+        results.sort(key=lambda r: percentile(r[2], 50) if r[2] else 0, reverse=True)
+        self.stdout.write(
+            f'{"template":40} {"parse p50":>10} {"render p50":>11} {"render p95":>11} '
+            f'{"fragments cached":>17} {"size":>9}'
+        )
+        for name, parse, render, warm, size, error in results:
+            if error:
+                self.stdout.write(f'{name:40} {percentile(parse, 50) * 1000:8.2f}ms  render failed: {error}')
+                continue
+            self.stdout.write(
+                f'{name:40} {percentile(parse, 50) * 1000:8.2f}ms '
+                f'{percentile(render, 50) * 1000:9.2f}ms {percentile(render, 95) * 1000:9.2f}ms '
+                f'{percentile(warm, 50) * 1000:15.2f}ms {size / 1024:7.1f}KB'
+            )
+
+    def templates(self):
+        for directory in settings.TEMPLATES[0]['DIRS']:
+            for root, _, files in os.walk(directory):
+                for filename in sorted(files):
+                    if filename.endswith('.html'):
+                        path = os.path.join(root, filename)
+                        yield os.path.relpath(path, directory).replace(os.sep, '/'), path
@@ -0,0 +1,43 @@
+import subprocess
+from urllib.error import URLError
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from internet import assets
+
+
+class Command(BaseCommand):
+    help = (
+        'Compile the purged Tailwind stylesheet with the standalone CLI, vendor Chart.js and '
+        'optionally run collectstatic to fingerprint and precompress everything.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-minify', action='store_true')
+        parser.add_argument('--refresh-vendor', action='store_true',
+                            help=f'Download Chart.js {assets.CHARTJS_VERSION} again even if it is vendored.')
+        parser.add_argument('--collect', action='store_true', help='Run collectstatic afterwards.')
+
+    def handle(self, *args, **options):
+        try:
+            size = assets.build_css(minify=not options['no_minify'])
+        except FileNotFoundError:
+            raise CommandError(
+                f'Tailwind CLI not found ({settings.TAILWIND_CLI}). Download the v3 standalone binary from '
+                'https://github.com/tailwindlabs/tailwindcss/releases and set TAILWIND_CLI to its path.'
+            )
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f'Tailwind failed: {e.stderr.decode(errors="replace")}')
+        self.stdout.write(f'{assets.CSS_OUTPUT}: {size / 1024:.1f} KB')
+
+        try:
+            if assets.vendor_chartjs(refresh=options['refresh_vendor']):
+                self.stdout.write(f'Downloaded Chart.js {assets.CHARTJS_VERSION} to {assets.CHARTJS_OUTPUT}')
+        except URLError as e:
+            raise CommandError(f'Could not download Chart.js: {e}')
+
+        if options['collect']:
+            call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+        self.stdout.write(self.style.SUCCESS('Assets built.'))
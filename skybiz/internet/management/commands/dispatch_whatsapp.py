@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from internet import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued WhatsApp notifications, retrying failed ones once their backoff has passed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE)
+        parser.add_argument('--loop', type=int, metavar='SECONDS',
+                            help='Keep running, checking the outbox every SECONDS.')
+
+    def handle(self, *args, **options):
+        while True:
+            results = outbox.dispatch(batch_size=options['batch_size'])
+            if results or not options['loop']:
+                summary = ', '.join(f'{count} {status}' for status, count in sorted(results.items()))
+                self.stdout.write(self.style.SUCCESS(f'WhatsApp outbox: {summary or "nothing due"}.'))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
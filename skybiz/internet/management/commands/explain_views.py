@@ -0,0 +1,112 @@
+import json
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from internet import seed
+from internet.scratch import ROUTE_KWARGS, Rollback, scratch_state
+from internet.urls import urlpatterns
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+SQLITE_TABLE = re.compile(r'^(?:SCAN|SEARCH) (?:TABLE )?(\w+)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large dataset inside a transaction, request every page and run EXPLAIN on each '
+        'query. Flags sequential scans and sorts on big tables; exits with an error when any are found. '
+        'Nothing is left behind in the database or the caches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50_000, help='Speed test rows to seed (other tables scale with it).')
+        parser.add_argument('--no-seed', action='store_true', help='Use the data already in the database.')
+        parser.add_argument('--min-rows', type=int, default=5_000,
+                            help='Only flag scans and sorts on tables with at least this many rows.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'EXPLAIN parsing is not implemented for {connection.vendor}.')
+
+        problems = []
+        try:
+            with scratch_state(), transaction.atomic():
+                if not options['no_seed']:
+                    self.stdout.write(f'Seeding {options["rows"]} speed tests...')
+                    seed.seed(options['rows'])
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                sizes = {model._meta.db_table: model.objects.count() for model in apps.get_models()}
+                problems = self.check_views(sizes, options['min_rows'], options['verbosity'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if problems:
+            for view, sql, reason in problems:
+                self.stdout.write(self.style.ERROR(f'{view}: {reason}\n    {sql}'))
+            raise CommandError(f'{len(problems)} query plan problems found.')
+        self.stdout.write(self.style.SUCCESS('No sequential scans or sorts on big tables.'))
+
+    def check_views(self, sizes, min_rows, verbosity):
+        staff = User.objects.create(username='explain-views-staff', is_staff=True, is_superuser=True)
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        client = Client(HTTP_HOST=host)
+        client.force_login(staff)
+
+        problems = []
+        for pattern in urlpatterns:
+            for kwargs in ROUTE_KWARGS.get(pattern.name, [{}]):
+                url = reverse(pattern.name, kwargs=kwargs)
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                statements = list(dict.fromkeys(
+                    q['sql'] for q in queries.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')
+                ))
+                self.stdout.write(f'{url} [{response.status_code}]: {len(statements)} queries')
+                for sql in statements:
+                    plan, reasons = self.explain(sql, sizes, min_rows)
+                    if verbosity > 1:
+                        self.stdout.write(f'  {sql}\n{plan}')
+                    problems += [(url, sql, reason) for reason in reasons]
+        return problems
+
+    def explain(self, sql, sizes, min_rows):
+        """Return (plan text, [problems]) for one statement."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                root = plan[0]['Plan']
+                return json.dumps(root, indent=2), list(self.postgres_problems(root, sizes, min_rows))
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[3] for row in cursor.fetchall()]
+        return '\n'.join(f'    {d}' for d in details), list(self.sqlite_problems(details, sizes, min_rows))
+
+    def postgres_problems(self, node, sizes, min_rows):
+        if node['Node Type'] == 'Seq Scan' and sizes.get(node['Relation Name'], 0) >= min_rows:
+            yield f'Seq Scan on {node["Relation Name"]} ({sizes[node["Relation Name"]]} rows)'
+        if node['Node Type'] in ('Sort', 'Incremental Sort') and node['Plan Rows'] >= min_rows:
+            yield f'{node["Node Type"]} of ~{node["Plan Rows"]} rows on {", ".join(node["Sort Key"])}'
+        for child in node.get('Plans', []):
+            yield from self.postgres_problems(child, sizes, min_rows)
+
+    def sqlite_problems(self, details, sizes, min_rows):
+        # SQLite reports no row estimates, judge by the size of the tables involved
+        tables = [m.group(1) for m in map(SQLITE_TABLE.match, details) if m]
+        largest = max((sizes.get(table, 0) for table in tables), default=0)
+        for detail in details:
+            scan = SQLITE_SCAN.match(detail)
+            if scan and 'USING' not in scan.group(2) and sizes.get(scan.group(1), 0) >= min_rows:
+                yield f'Full scan of {scan.group(1)} ({sizes[scan.group(1)]} rows)'
+            if detail.startswith('USE TEMP B-TREE') and largest >= min_rows:
+                yield f'Sort without an index ({detail})'
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from internet import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic dataset the size of production into the configured database: '
+        'speed tests with realistic daily and hourly patterns plus users, profiles, packages, '
+        'branches, messages and quote requests. Uses COPY on PostgreSQL, batched bulk_create elsewhere.'
+    )
+
+    def add_arguments(self, parser):
+        size = parser.add_mutually_exclusive_group()
+        size.add_argument('--tier', choices=seed.TIERS, default='medium',
+                          help=', '.join(f'{name}={rows:,}' for name, rows in seed.TIERS.items()) + ' speed tests.')
+        size.add_argument('--speed-tests', type=int, help='Exact number of speed test rows.')
+        parser.add_argument('--days', type=int, default=365, help='Spread the data over this many days.')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation.')
+
+    def handle(self, *args, **options):
+        speed_tests = options['speed_tests'] or seed.TIERS[options['tier']]
+        sizes = seed.counts(speed_tests)
+        if options['interactive']:
+            answer = input(
+                f'This adds {speed_tests:,} speed tests and {sizes["users"]:,} users to the '
+                f'"{connection.settings_dict["NAME"]}" database. Type \'yes\' to continue: '
+            )
+            if answer != 'yes':
+                raise CommandError('Cancelled.')
+
+        start = time.perf_counter()
+        sizes = seed.seed(speed_tests, days=options['days'])
+        loaded = time.perf_counter() - start
+        for table, rows in sizes.items():
+            self.stdout.write(f'  {table:20} {rows:>12,}')
+        self.stdout.write(f'Loaded in {loaded:.1f}s ({speed_tests / loaded:,.0f} speed tests/s)')
+
+        self.stdout.write('Rebuilding rollups and caches...')
+        start = time.perf_counter()
+        seed.refresh()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - start:.1f}s'))
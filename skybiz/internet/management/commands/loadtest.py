@@ -0,0 +1,145 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from internet import loadtest, seed
+from internet.scratch import ROUTE_KWARGS, scratch_state
+from internet.urls import urlpatterns
+
+# Query strings that keep routes cheap enough to hammer
+ROUTE_QUERY = {'speed_test_download': 'size=65536'}
+
+
+def staff_route(name):
+    return name.startswith('admin') or name == 'dashboard'
+
+
+class Command(BaseCommand):
+    help = (
+        'Create a separate load test database and caches, seed it, serve the site over HTTP on a local port and '
+        'drive every route in internet/urls.py with concurrent clients (admin pages as staff). Reports '
+        'throughput, p50/p95/p99 latency and queries per request per route and writes them as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10_000, help='Speed test rows to seed (other tables scale with it).')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent clients.')
+        parser.add_argument('--routes', nargs='*', help='Only these URL names.')
+        parser.add_argument('--output', default='loadtest.json', help='JSON results file.')
+        parser.add_argument('--compare', metavar='JSON', help='Show the p95 change against an earlier results file.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the seeded database for the next run.')
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)['routes']
+
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # A file, so the server threads share it
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'skybiz-loadtest.sqlite3')
+        elif not test_settings.get('NAME'):
+            test_settings['NAME'] = f'loadtest_{connection.settings_dict["NAME"]}'
+
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False,
+        )
+        try:
+            # Seeded pages and the load test's requests stay out of the real caches and metrics
+            with scratch_state(), override_settings(DEBUG=False, QUERY_BUDGET_HEADER=True, ALLOWED_HOSTS=['127.0.0.1']):
+                if options['keepdb'] and User.objects.filter(username__startswith='seed').exists():
+                    self.stdout.write('Reusing the seeded load test database.')
+                else:
+                    self.seed(options['scale'])
+                cookie = self.staff_cookie()
+                with loadtest.serve() as address:
+                    routes = self.run(address, cookie, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        report = {'meta': self.meta(options), 'routes': routes}
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+        if previous:
+            self.compare(previous, routes)
+        if any(route['errors'] or any(code.startswith('5') for code in route['statuses']) for route in routes.values()):
+            raise CommandError('Some requests failed or returned 5xx, see the results file.')
+
+    def seed(self, scale):
+        self.stdout.write(f'Seeding {scale} speed tests...')
+        seed.seed(scale)
+        seed.refresh()
+
+    def staff_cookie(self):
+        staff, _ = User.objects.get_or_create(
+            username='loadtest-staff', defaults={'is_staff': True, 'is_superuser': True},
+        )
+        client = Client()
+        client.force_login(staff)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def run(self, address, cookie, options):
+        routes = {}
+        self.stdout.write(f'{"route":45} {"req/s":>8} {"p50":>9} {"p95":>9} {"p99":>9} {"queries":>8}  status')
+        for pattern in urlpatterns:
+            if options['routes'] and pattern.name not in options['routes']:
+                continue
+            for kwargs in ROUTE_KWARGS.get(pattern.name, [{}]):
+                path = reverse(pattern.name, kwargs=kwargs)
+                if pattern.name in ROUTE_QUERY:
+                    path += '?' + ROUTE_QUERY[pattern.name]
+                headers = {'Cookie': cookie} if staff_route(pattern.name) else {}
+                result = loadtest.drive(address, path, options['requests'], options['concurrency'], headers)
+                summary = loadtest.summarize(result)
+                routes[path] = {'name': pattern.name, 'staff': staff_route(pattern.name), **summary}
+                latency = summary['latency_ms'] or {}
+                queries = summary['queries'] or {}
+                self.stdout.write(
+                    f'{path:45} {summary["throughput_rps"]:8.1f} '
+                    f'{latency.get("p50", 0):7.2f}ms {latency.get("p95", 0):7.2f}ms {latency.get("p99", 0):7.2f}ms '
+                    f'{queries.get("mean", 0):8.1f}  {summary["statuses"]}'
+                )
+        return routes
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'scale': options['scale'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+
+    def compare(self, previous, routes):
+        self.stdout.write('p95 against the earlier run:')
+        for path, route in routes.items():
+            before = (previous.get(path) or {}).get('latency_ms')
+            after = route['latency_ms']
+            if before and after and before['p95']:
+                change = (after['p95'] - before['p95']) / before['p95'] * 100
+                self.stdout.write(f'  {path:45} {before["p95"]:8.2f}ms -> {after["p95"]:8.2f}ms ({change:+.0f}%)')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from internet import purge
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete old speed tests, contact messages and business requests in small batches. '
+        'Without arguments applies the RETENTION_DAYS policies.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('section', nargs='?', choices=sorted(purge.PURGEABLE), help='Only purge this data.')
+        parser.add_argument('--older-than', type=int, metavar='DAYS', help='Override the retention period.')
+        parser.add_argument('--all', action='store_true', help='Delete every row of the section.')
+        parser.add_argument('--batch-size', type=int, default=purge.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would go.')
+
+    def handle(self, *args, **options):
+        section = options['section']
+        dry_run = options['dry_run']
+        if (options['all'] or options['older_than'] is not None) and not section:
+            raise CommandError('--all and --older-than need a section.')
+
+        def progress(name, deleted):
+            self.stdout.write(f'  {name}: {deleted} deleted...')
+
+        if section:
+            if options['all']:
+                model, _ = purge.PURGEABLE[section]
+                queryset = model.objects.all()
+            else:
+                queryset = purge.expired(section, options['older_than'])
+            results = {section: purge.purge(
+                queryset,
+                batch_size=options['batch_size'],
+                dry_run=dry_run,
+                progress=lambda n: progress(section, n),
+            )}
+        else:
+            results = purge.apply_retention(batch_size=options['batch_size'], dry_run=dry_run, progress=progress)
+            if not results:
+                self.stdout.write('No retention policies configured (RETENTION_DAYS).')
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        for name, count in results.items():
+            self.stdout.write(self.style.SUCCESS(f'{verb} {count} {name.replace("_", " ")}.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from internet import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily speed test rollups from the SpeedTestResult table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        hourly, daily = rollups.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {hourly} hourly and {daily} daily rollups.'))
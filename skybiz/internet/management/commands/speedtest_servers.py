@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from internet import speedtest_servers
+
+
+class Command(BaseCommand):
+    help = 'Warm or inspect the cached speedtest.net server list and best server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warm', action='store_true', help='Fetch servers and pick the best one now.')
+
+    def handle(self, *args, **options):
+        if options['warm']:
+            try:
+                speedtest_servers.refresh()
+            except Exception as e:
+                raise CommandError(f'Could not refresh speed test servers: {e}')
+            self.stdout.write(self.style.SUCCESS('Speed test server cache warmed.'))
+
+        entry = speedtest_servers.get_entry()
+        if entry is None:
+            self.stdout.write('Speed test server cache is empty. Run with --warm to fill it.')
+            return
+
+        age = time.time() - entry['fetched_at']
+        ttl = speedtest_servers.cache_ttl()
+        best = entry['best']
+        self.stdout.write(f"Fetched {int(age)}s ago (TTL {ttl}s, {'stale' if age > ttl else 'fresh'})")
+        self.stdout.write(
+            f"Best server: {best.get('sponsor')} - {best.get('name')}, {best.get('country')} "
+            f"({best.get('latency', 0):.1f} ms)"
+        )
+        self.stdout.write(f"Closest servers cached: {len(entry['closest'])}")
+        for server in entry['closest']:
+            self.stdout.write(f"  {server.get('id')}: {server.get('sponsor')} - {server.get('name')} ({server.get('d', 0):.0f} km)")
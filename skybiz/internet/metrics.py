@@ -0,0 +1,258 @@
+"""Prometheus metrics that add up across worker processes.
+
+Recording is lock-free: every thread counts into its own shard (plain
+dicts), so the hot path is a thread-local lookup and a dict update, a
+couple of microseconds. Each process sums its shards and writes them to
+METRICS_DIR/<pid>-<token>.json at most every METRICS_FLUSH_INTERVAL
+seconds, after a request. A scrape flushes the serving process and adds
+up every file in the directory, so it sees all workers whichever one
+answers it.
+
+Files of exited workers are kept so counters never go backwards; empty
+METRICS_DIR when the service (re)starts, as with prometheus_client's
+multiprocess mode.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Seconds. Speed tests and external APIs get longer buckets than views
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+EXTERNAL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SPEEDTEST_BUCKETS = (0.5, 1, 2.5, 5, 10, 15, 20, 30, 45, 60, 120)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'skybiz_requests_total': ('counter', 'Requests by view, method and status.', None),
+    'skybiz_request_duration_seconds': ('histogram', 'Request latency by view.', REQUEST_BUCKETS),
+    'skybiz_db_queries_total': ('counter', 'Database queries run by requests, by view.', None),
+    'skybiz_db_query_seconds_total': ('counter', 'Time spent in database queries, by view.', None),
+    'skybiz_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit or miss).', None),
+    'skybiz_speedtest_phase_seconds': ('histogram', 'Server-side speed test phase durations.', SPEEDTEST_BUCKETS),
+    'skybiz_speedtest_failures_total': ('counter', 'Server-side speed tests that failed, by phase.', None),
+    'skybiz_external_call_seconds': ('histogram', 'Twilio and SMTP call latency by outcome.', EXTERNAL_BUCKETS),
+}
+
+_local = threading.local()
+_shards = []  # (thread weakref, shard)
+_shards_lock = threading.Lock()
+_retired = None
+_state = {'token': uuid.uuid4().hex[:8], 'flushed': 0.0}
+
+
+class Shard:
+    def __init__(self):
+        self.counters = {}
+        # key -> [count per bucket..., count above the last bucket, sum]
+        self.histograms = {}
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = Shard()
+        with _shards_lock:
+            _shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+
+def inc(name, labels=(), value=1):
+    """Add ``value`` to counter ``name``; labels are a tuple of (name, value) pairs."""
+    counters = _shard().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, labels, value):
+    histograms = _shard().histograms
+    key = (name, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = [0] * (len(METRICS[name][2]) + 2)
+    histogram[bisect_left(METRICS[name][2], value)] += 1
+    histogram[-1] += value
+
+
+def cache_lookup(name, hit):
+    inc('skybiz_cache_requests_total', (('cache', name), ('result', 'hit' if hit else 'miss')))
+
+
+@contextmanager
+def speedtest_phase(phase):
+    """Time a server-side speed test phase, counting it as failed if it raises."""
+    labels = (('phase', phase),)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc('skybiz_speedtest_failures_total', labels)
+        raise
+    finally:
+        observe('skybiz_speedtest_phase_seconds', labels, time.perf_counter() - start)
+
+
+@contextmanager
+def external_call(service):
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        observe('skybiz_external_call_seconds', (('service', service), ('outcome', outcome)),
+                time.perf_counter() - start)
+
+
+def _merge(counters, histograms, shard):
+    for key, value in list(shard.counters.items()):
+        counters[key] = counters.get(key, 0) + value
+    for key, values in list(shard.histograms.items()):
+        total = histograms.setdefault(key, [0] * len(values))
+        for i, value in enumerate(list(values)):
+            total[i] += value
+
+
+def snapshot():
+    """This process's totals as ({key: value}, {key: buckets})."""
+    global _retired
+    counters, histograms = {}, {}
+    with _shards_lock:
+        # Fold the shards of finished threads into one, so thread-per-request
+        # servers don't grow the list forever
+        alive = []
+        for thread, shard in _shards:
+            if thread() is not None and thread().is_alive():
+                alive.append((thread, shard))
+            else:
+                _retired = _retired or Shard()
+                _merge(_retired.counters, _retired.histograms, shard)
+        _shards[:] = alive
+        shards = [shard for _, shard in alive] + ([_retired] if _retired else [])
+    for shard in shards:
+        _merge(counters, histograms, shard)
+    return counters, histograms
+
+
+def _path():
+    return os.path.join(settings.METRICS_DIR, f'{os.getpid()}-{_state["token"]}.json')
+
+
+def flush():
+    counters, histograms = snapshot()
+    data = {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+    }
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = _path()
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(f'{path}.tmp', path)
+    _state['flushed'] = time.monotonic()
+
+
+def flush_due():
+    return time.monotonic() - _state['flushed'] > settings.METRICS_FLUSH_INTERVAL
+
+
+def reset():
+    """Forget everything this process has counted and not yet flushed."""
+    global _retired
+    _local.__dict__.clear()
+    _shards.clear()
+    _retired = None
+    _state.update(token=uuid.uuid4().hex[:8], flushed=0.0)
+
+
+# A forked worker must not report what its parent counted before the fork
+os.register_at_fork(after_in_child=reset)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _shards or _retired:
+        flush()
+
+
+def collect():
+    """Totals across every process that wrote to METRICS_DIR."""
+    flush()
+    counters, histograms = {}, {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(extra=()):
+    """The Prometheus text exposition of collect() plus ``extra`` metrics.
+
+    ``extra`` is a list of (name, type, help, [(labels, value), ...]) read
+    from elsewhere at scrape time.
+    """
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), values[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels((*labels, ("le", str(bound))))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(values[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    hits = {}
+    for (metric, labels), value in counters.items():
+        if metric == 'skybiz_cache_requests_total':
+            labels = dict(labels)
+            hits.setdefault(labels['cache'], {'hit': 0, 'miss': 0})[labels['result']] += value
+    extra = [('skybiz_cache_hit_ratio', 'gauge', 'Share of cache lookups that were hits.', [
+        ((('cache', cache),), round(counts['hit'] / (counts['hit'] + counts['miss']), 4))
+        for cache, counts in sorted(hits.items())
+    ]), *extra]
+    for name, kind, help, samples in extra:
+        lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+        lines += [f'{name}{_labels(labels)} {_number(value)}' for labels, value in samples]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,235 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import metrics, profiling
+from .profiling import Profile, wrap_connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """execute_wrapper that records every query run during a request."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+        self.exact = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            # Django keeps parameters out of the SQL, so the statement
+            # itself is the fingerprint; params tell exact repeats apart
+            self.statements[sql] += 1
+            try:
+                self.exact[(sql, repr(params))] += 1
+            except Exception:
+                pass
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.exact.values() if n > 1)
+
+    @property
+    def similar(self):
+        return sum(n - 1 for n in self.statements.values() if n > 1)
+
+    def repeated(self, limit=3):
+        return [(sql, n) for sql, n in self.statements.most_common(limit) if n > 1]
+
+
+class QueryBudgetMiddleware:
+    """Count DB queries per request and flag views that go over budget.
+
+    QUERY_BUDGET_HEADER adds an X-DB-Queries header (keep it off in
+    production). QUERY_BUDGETS maps view names to their maximum query
+    count, QUERY_BUDGET_DEFAULT covers everything else.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        with wrap_connections(stats):
+            response = self.get_response(request)
+        return self._report(request, response, stats)
+
+    async def __acall__(self, request):
+        # Connections are per thread and the async ORM runs queries in the
+        # request's thread-sensitive executor, so wrap them there
+        stats = QueryStats()
+        stack = await sync_to_async(wrap_connections)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._report(request, response, stats)
+
+    def _report(self, request, response, stats):
+        request.query_stats = stats
+        if getattr(settings, 'QUERY_BUDGET_HEADER', False):
+            response['X-DB-Queries'] = (
+                f'count={stats.count}; time={stats.time * 1000:.1f}ms; '
+                f'duplicates={stats.duplicates}; similar={stats.similar}'
+            )
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = budgets.get(view_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', 20))
+        if stats.count > budget:
+            logger.warning(
+                f"{view_name or request.path} ran {stats.count} queries (budget {budget}, "
+                f"{stats.time * 1000:.1f}ms, {stats.similar} repeated): {stats.repeated()}"
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """Break each request's time down into phases (see internet.profiling).
+
+    PROFILING_HEADER adds a Server-Timing header, which browser dev tools
+    show in the network panel. Sampled requests go to the ring buffer
+    behind the admin dashboard's slowest requests panel.
+
+    Staff can add ?PROFILING_QUERY_PARAM=<sort> to a URL to get a cProfile
+    of the view instead of the page, sorted by any pstats key (cumulative
+    by default). Only sync requests can be captured: cProfile follows one
+    thread, and an async view hops between the event loop and executors.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = Profile(request.path)
+        with profile.activate(), wrap_connections(profile):
+            response = self.get_response(request)
+        response = self._finish(request, response, profile)
+        if profiling.sampled():
+            profiling.record(self._entry(request, response, profile))
+        return response
+
+    async def __acall__(self, request):
+        profile = Profile(request.path)
+        with profile.activate():
+            stack = await sync_to_async(wrap_connections)(profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        response = self._finish(request, response, profile)
+        if profiling.sampled():
+            await profiling.arecord(self._entry(request, response, profile))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        sort = request.GET.get(settings.PROFILING_QUERY_PARAM)
+        if sort is None or iscoroutinefunction(self) or not request.user.is_staff:
+            return None
+        request.cprofile = cProfile.Profile()
+        try:
+            request.cprofile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process
+            del request.cprofile
+            return HttpResponse('Another request is being profiled, try again.', status=409,
+                                content_type='text/plain; charset=utf-8')
+        return None
+
+    def _finish(self, request, response, profile):
+        if hasattr(request, 'cprofile'):
+            request.cprofile.disable()
+            response = self._profile_response(request.cprofile, request.GET[settings.PROFILING_QUERY_PARAM])
+            logger.info(f"cProfile captured for {request.path} by {request.user}")
+        if settings.PROFILING_HEADER or hasattr(request, 'cprofile'):
+            response['Server-Timing'] = profile.server_timing()
+        return response
+
+    def _profile_response(self, profiler, sort):
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(sort if sort in pstats.Stats.sort_arg_dict_default else 'cumulative')
+        stats.print_stats(settings.PROFILING_LINES)
+        return HttpResponse(stream.getvalue(), content_type='text/plain; charset=utf-8')
+
+    def _entry(self, request, response, profile):
+        match = getattr(request, 'resolver_match', None)
+        return profile.entry(
+            view=match.view_name if match else None,
+            method=request.method,
+            status=response.status_code,
+        )
+
+
+class MetricsMiddleware:
+    """Count requests, latency and queries per view for /metrics.
+
+    Goes first in MIDDLEWARE so the latency covers the whole stack; the
+    query counts come from QueryBudgetMiddleware's request.query_stats.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        if metrics.flush_due():
+            metrics.flush()
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        if metrics.flush_due():
+            await sync_to_async(metrics.flush, thread_sensitive=False)()
+        return response
+
+    def _record(self, request, response, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        # Unmatched paths share one label so scanners can't blow up the series count
+        view = (('view', match.view_name if match else 'unmatched'),)
+        metrics.inc('skybiz_requests_total', (*view, ('method', request.method), ('status', str(response.status_code))))
+        metrics.observe('skybiz_request_duration_seconds', view, elapsed)
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            metrics.inc('skybiz_db_queries_total', view, stats.count)
+            metrics.inc('skybiz_db_query_seconds_total', view, stats.time)
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internet', '0002_newsticker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeedTestDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('download_sum', models.FloatField(default=0)),
+                ('download_sq_sum', models.FloatField(default=0)),
+                ('download_min', models.FloatField(blank=True, null=True)),
+                ('download_max', models.FloatField(blank=True, null=True)),
+                ('upload_sum', models.FloatField(default=0)),
+                ('upload_sq_sum', models.FloatField(default=0)),
+                ('upload_min', models.FloatField(blank=True, null=True)),
+                ('upload_max', models.FloatField(blank=True, null=True)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_sq_sum', models.FloatField(default=0)),
+                ('latency_min', models.FloatField(blank=True, null=True)),
+                ('latency_max', models.FloatField(blank=True, null=True)),
+                ('bucket', models.DateField(unique=True)),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SpeedTestHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('download_sum', models.FloatField(default=0)),
+                ('download_sq_sum', models.FloatField(default=0)),
+                ('download_min', models.FloatField(blank=True, null=True)),
+                ('download_max', models.FloatField(blank=True, null=True)),
+                ('upload_sum', models.FloatField(default=0)),
+                ('upload_sq_sum', models.FloatField(default=0)),
+                ('upload_min', models.FloatField(blank=True, null=True)),
+                ('upload_max', models.FloatField(blank=True, null=True)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_sq_sum', models.FloatField(default=0)),
+                ('latency_min', models.FloatField(blank=True, null=True)),
+                ('latency_max', models.FloatField(blank=True, null=True)),
+                ('bucket', models.DateTimeField(unique=True)),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'abstract': False,
+            },
+        ),
+    ]
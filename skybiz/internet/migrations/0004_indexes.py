@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internet', '0003_speedtest_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='branch',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='branch_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='branch',
+            index=models.Index(fields=['-created_at', '-id'], name='branch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessquoterequest',
+            index=models.Index(fields=['-created_at', '-id'], name='quote_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['-created_at', '-id'], name='message_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsticker',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='news_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsticker',
+            index=models.Index(fields=['-created_at', '-id'], name='news_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['package_type'], name='package_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('is_popular', True)), fields=['id'], name='package_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['-created_at', '-id'], name='package_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='speedtestresult',
+            index=models.Index(fields=['-timestamp', '-id'], name='speedtest_timestamp_idx'),
+        ),
+    ]
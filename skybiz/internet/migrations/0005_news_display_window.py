@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internet', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsticker',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='newsticker',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,19 +1,36 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class NewsTicker(models.Model):
     message = models.CharField(max_length=500)
     is_active = models.BooleanField(default=True)
+    # Optional display window; empty means from now on / until deactivated
+    starts_at = models.DateTimeField(blank=True, null=True)
+    ends_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.message[:50]
 
+    def is_showing(self, now):
+        return (
+            self.is_active
+            and (self.starts_at is None or self.starts_at <= now)
+            and (self.ends_at is None or self.ends_at > now)
+        )
+
     class Meta:
         verbose_name = "News Ticker"
         verbose_name_plural = "News Ticker"
         ordering = ['-created_at']
+        indexes = [
+            # Ticker shows only active news, newest first
+            models.Index(fields=['-created_at'], condition=Q(is_active=True), name='news_active_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='news_created_idx'),
+        ]
         
 class Package(models.Model):
     PACKAGE_TYPES = [
@@ -34,6 +51,14 @@ class Package(models.Model):
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['package_type'], name='package_type_idx'),
+            # Home page lists a handful of popular packages
+            models.Index(fields=['id'], condition=Q(is_popular=True), name='package_popular_idx'),
+            models.Index(fields=['-created_at', '-id'], name='package_created_idx'),
+        ]
+
 class ContactMessage(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -45,6 +70,43 @@ class ContactMessage(models.Model):
     def __str__(self):
         return f"{self.name} - {self.subject}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='message_created_idx'),
+        ]
+
+class WhatsAppOutbox(models.Model):
+    """WhatsApp notification waiting to be sent by internet.outbox."""
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    ]
+    contact_message = models.ForeignKey(ContactMessage, on_delete=models.SET_NULL, null=True, blank=True)
+    to = models.CharField(max_length=30)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    provider_sid = models.CharField(max_length=64, blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"WhatsApp to {self.to} ({self.status})"
+
+    class Meta:
+        verbose_name = "WhatsApp Outbox"
+        verbose_name_plural = "WhatsApp Outbox"
+        indexes = [
+            # The dispatcher only ever looks at due, pending rows
+            models.Index(fields=['next_attempt_at'], condition=Q(status='pending'), name='outbox_pending_idx'),
+        ]
+
 class BusinessQuoteRequest(models.Model):
     company_name = models.CharField(max_length=100)
     contact_person = models.CharField(max_length=100)
@@ -57,6 +119,11 @@ class BusinessQuoteRequest(models.Model):
     def __str__(self):
         return f"{self.company_name} - {self.contact_person}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='quote_created_idx'),
+        ]
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     package = models.ForeignKey(Package, on_delete=models.SET_NULL, null=True, blank=True)
@@ -75,6 +142,48 @@ class SpeedTestResult(models.Model):
     def __str__(self):
         return f"Speed Test - {self.timestamp}"
 
+    class Meta:
+        indexes = [
+            # Recent tests, keyset paging and retention/archive cutoffs
+            models.Index(fields=['-timestamp', '-id'], name='speedtest_timestamp_idx'),
+        ]
+
+class SpeedTestRollup(models.Model):
+    count = models.PositiveIntegerField(default=0)
+    download_sum = models.FloatField(default=0)
+    download_sq_sum = models.FloatField(default=0)
+    download_min = models.FloatField(null=True, blank=True)
+    download_max = models.FloatField(null=True, blank=True)
+    upload_sum = models.FloatField(default=0)
+    upload_sq_sum = models.FloatField(default=0)
+    upload_min = models.FloatField(null=True, blank=True)
+    upload_max = models.FloatField(null=True, blank=True)
+    latency_sum = models.FloatField(default=0)
+    latency_sq_sum = models.FloatField(default=0)
+    latency_min = models.FloatField(null=True, blank=True)
+    latency_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['bucket']
+
+    def average(self, metric):
+        if not self.count:
+            return 0
+        return getattr(self, f'{metric}_sum') / self.count
+
+class SpeedTestHourlyRollup(SpeedTestRollup):
+    bucket = models.DateTimeField(unique=True)
+
+    def __str__(self):
+        return f"Speed Tests - {self.bucket:%Y-%m-%d %H:00}"
+
+class SpeedTestDailyRollup(SpeedTestRollup):
+    bucket = models.DateField(unique=True)
+
+    def __str__(self):
+        return f"Speed Tests - {self.bucket}"
+
 # class CarouselImage(models.Model):
 #     title = models.CharField(max_length=100)
 #     caption = models.TextField(blank=True, null=True)
@@ -99,4 +208,11 @@ class Branch(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.name} - {self.city}, {self.state}"
\ No newline at end of file
+        return f"{self.name} - {self.city}, {self.state}"
+
+    class Meta:
+        indexes = [
+            # Contact page lists active branches only
+            models.Index(fields=['id'], condition=Q(is_active=True), name='branch_active_idx'),
+            models.Index(fields=['-created_at', '-id'], name='branch_created_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""Delivery of queued WhatsApp notifications.
+
+Views write a WhatsAppOutbox row in the same transaction as the data it is
+about and call kick() once that commits. The dispatcher claims due rows in
+batches, sends them through the Twilio REST API over one reused HTTP
+session and retries failures with exponential backoff until the row is
+sent or marked dead. The dispatch_whatsapp command drains the outbox too,
+which picks up retries and anything left behind by a restarted worker.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import metrics, profiling
+from .models import WhatsAppOutbox
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30  # seconds before the first retry, doubled after each failure
+BACKOFF_MAX = 6 * 60 * 60
+CLAIM_LEASE = 5 * 60  # claimed rows are hidden from other dispatchers this long
+TIMEOUT = 10
+# E.164: a country code and subscriber number, at most 15 digits in all
+PHONE_RE = re.compile(r'\+[1-9]\d{6,14}')
+
+
+class PermanentError(Exception):
+    """Twilio rejected the message itself; retrying will not help."""
+
+
+_session = None
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+_kick_lock = threading.Lock()
+_kicked = False
+
+
+def session():
+    global _session
+    if _session is None:
+        # Imported on first send so web workers that never notify don't pay for it
+        import requests
+        _session = requests.Session()
+        _session.auth = (settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    return _session
+
+
+def normalize_phone(phone):
+    """Return ``phone`` as an E.164 number, or None if it can't be one.
+
+    Spaces, dashes, dots and brackets are dropped and a leading 00 becomes +.
+    """
+    phone = re.sub(r'[\s().-]', '', phone or '')
+    if phone.startswith('00'):
+        phone = '+' + phone[2:]
+    return phone if PHONE_RE.fullmatch(phone) else None
+
+
+def enqueue(to, body, contact_message=None):
+    """Queue a WhatsApp message. Call inside the transaction saving the data."""
+    return WhatsAppOutbox.objects.create(to=to, body=body, contact_message=contact_message)
+
+
+def send(row):
+    """Send one row through Twilio and return the message SID."""
+    url = f'{settings.TWILIO_API_BASE}/2010-04-01/Accounts/{settings.TWILIO_ACCOUNT_SID}/Messages.json'
+    with profiling.phase('twilio'), metrics.external_call('twilio'):
+        response = session().post(url, data={
+            'From': f'whatsapp:{settings.TWILIO_WHATSAPP_NUMBER}',
+            'To': f'whatsapp:{row.to}',
+            'Body': row.body,
+        }, timeout=TIMEOUT)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        if response.status_code >= 400:
+            raise PermanentError(f'{response.status_code}: {response.text[:500]}')
+        # Any 2xx means Twilio accepted the message; a body we can't read
+        # must not get it retried and sent twice
+        try:
+            return response.json().get('sid', '')
+        except (ValueError, AttributeError):
+            return ''
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim(batch_size=BATCH_SIZE):
+    """Lease up to ``batch_size`` due rows to this dispatcher."""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            WhatsAppOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=WhatsAppOutbox.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        WhatsAppOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+            next_attempt_at=now + timedelta(seconds=CLAIM_LEASE),
+        )
+    return rows
+
+
+def deliver(row):
+    row.attempts += 1
+    try:
+        row.provider_sid = send(row)
+    except PermanentError as e:
+        row.status = WhatsAppOutbox.DEAD
+        row.last_error = str(e)
+    except Exception as e:
+        # Network errors, 429 and 5xx, and anything unexpected: retry the
+        # row and carry on with the rest of the batch
+        row.last_error = f'{type(e).__name__}: {e}'
+        if row.attempts >= MAX_ATTEMPTS:
+            row.status = WhatsAppOutbox.DEAD
+        else:
+            row.next_attempt_at = timezone.now() + timedelta(seconds=backoff(row.attempts))
+    else:
+        row.status = WhatsAppOutbox.SENT
+        row.sent_at = timezone.now()
+        row.last_error = ''
+    row.save(update_fields=['attempts', 'status', 'provider_sid', 'last_error', 'next_attempt_at', 'sent_at'])
+    if row.status == WhatsAppOutbox.DEAD:
+        logger.error(f"WhatsApp message {row.pk} to {row.to} is dead after {row.attempts} attempts: {row.last_error}")
+    elif row.status == WhatsAppOutbox.PENDING:
+        logger.warning(f"WhatsApp message {row.pk} failed (attempt {row.attempts}), retrying: {row.last_error}")
+    return row.status
+
+
+def dispatch(batch_size=BATCH_SIZE):
+    """Send every due row. Returns {status: count} for this run."""
+    results = {}
+    while True:
+        rows = claim(batch_size)
+        if not rows:
+            return results
+        for row in rows:
+            status = deliver(row)
+            results[status] = results.get(status, 0) + 1
+
+
+@profiling.track('whatsapp dispatch')
+def _dispatch_in_background():
+    global _kicked
+    with _kick_lock:
+        _kicked = False
+    close_old_connections()
+    try:
+        dispatch()
+    except Exception:
+        logger.exception('WhatsApp outbox dispatch failed')
+    finally:
+        close_old_connections()
+
+
+def kick():
+    """Start draining the outbox in this worker unless a run is already queued."""
+    global _kicked
+    with _kick_lock:
+        if _kicked:
+            return
+        _kicked = True
+    _executor.submit(_dispatch_in_background)
@@ -0,0 +1,209 @@
+"""Full-page cache for the public content pages.
+
+Anonymous GETs are answered from the 'pages' cache with bodies compressed
+ahead of time (gzip, and brotli when the module is installed), and
+If-None-Match / If-Modified-Since get a 304. Logged in users, requests
+with pending flash messages and responses that set cookies are never
+cached.
+
+Pages with a form are rendered with CSRF_PLACEHOLDER as their CSRF token
+(see context_processors.py) and stored once for everyone; each response
+gets the visitor's own token filled in and is compressed on the way out.
+
+Keys include a generation number bumped on Package, Branch and NewsTicker
+changes (see signals.py) and the current ticker ETag, so scheduled news
+shows up without an explicit invalidation.
+
+Async views (see async_views.py) get an async wrapper that only uses the
+async cache API.
+"""
+import gzip
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from . import metrics, ticker
+from .encoding import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GENERATION_KEY = 'pagecache:generation'
+CSRF_PLACEHOLDER = 'pagecache-csrf-token-placeholder'
+# Cheap enough to run per response for pages with a CSRF token
+BROTLI_QUALITY = 5
+
+
+def generation():
+    current = cache.get(GENERATION_KEY)
+    if current is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        current = cache.get(GENERATION_KEY)
+    return current
+
+
+async def ageneration():
+    current = await cache.aget(GENERATION_KEY)
+    if current is None:
+        await cache.aadd(GENERATION_KEY, time.time_ns(), None)
+        current = await cache.aget(GENERATION_KEY)
+    return current
+
+
+def invalidate():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def _key(request, current=None, fragment=None):
+    parts = [
+        str(generation() if current is None else current),
+        (fragment or ticker.get())['etag'],
+        request.scheme,
+        request.get_host(),
+        request.get_full_path(),
+    ]
+    return 'pagecache:' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    return len(get_messages(request)) == 0
+
+
+def _entry(response, csrf):
+    body = response.content
+    entry = {
+        'content_type': response['Content-Type'],
+        'body': body,
+        'csrf': csrf,
+        'etag': f'W/"{hashlib.md5(body).hexdigest()}"',
+        'last_modified': time.time(),
+    }
+    if not csrf:
+        entry['gzip'] = gzip.compress(body, 6)
+        if brotli is not None:
+            entry['br'] = brotli.compress(body)
+    return entry
+
+
+def _fill_csrf(request, body):
+    return body.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+
+
+def _respond(request, entry, status):
+    metrics.cache_lookup('page', status == 'hit')
+    accepted = accepted_encodings(request)
+    etag = entry['etag']
+    body = entry['body']
+    if entry['csrf']:
+        body = _fill_csrf(request, body)
+        # A copy the browser keeps only carries a valid token for the cookie it was sent with
+        cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+        etag = f'W/"{hashlib.md5((etag + cookie).encode()).hexdigest()}"'
+    response = HttpResponse(content_type=entry['content_type'])
+    if brotli is not None and 'br' in accepted:
+        response.content = entry['br'] if 'br' in entry else brotli.compress(body, quality=BROTLI_QUALITY)
+        response['Content-Encoding'] = 'br'
+    elif 'gzip' in accepted:
+        response.content = entry['gzip'] if 'gzip' in entry else gzip.compress(body, 6)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response.content = body
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    response['Cache-Control'] = 'no-cache'
+    response['X-Page-Cache'] = status
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(entry['last_modified']), response=response,
+    )
+
+
+def _storable(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    # The page carries a visitor's own CSRF token
+    return not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+
+
+def _uncached(request, response, csrf):
+    if csrf and not response.streaming:
+        response.content = _fill_csrf(request, response.content)
+    return response
+
+
+def page_cache(view=None, csrf=False):
+    """Serve ``view`` from the page cache for anonymous visitors.
+
+    Use ``csrf=True`` for pages that render a CSRF token.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _async_decorator(view, csrf)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request):
+                return view(request, *args, **kwargs)
+            pages = caches['pages']
+            key = _key(request)
+            entry = pages.get(key)
+            if entry is not None:
+                return _respond(request, entry, 'hit')
+
+            request.page_cache_csrf = csrf
+            response = view(request, *args, **kwargs)
+            if not _storable(request, response):
+                return _uncached(request, response, csrf)
+            entry = _entry(response, csrf)
+            pages.set(key, entry, settings.PAGE_CACHE_TIMEOUT)
+            return _respond(request, entry, 'miss')
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+
+def _async_decorator(view, csrf):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            # The user and message checks may load the session from the database
+            cacheable = await sync_to_async(_cacheable)(request)
+        else:
+            cacheable = _cacheable(request)
+        if not cacheable:
+            return await view(request, *args, **kwargs)
+        pages = caches['pages']
+        key = _key(request, await ageneration(), await ticker.aget())
+        entry = await pages.aget(key)
+        if entry is not None:
+            return _respond(request, entry, 'hit')
+
+        request.page_cache_csrf = csrf
+        response = await view(request, *args, **kwargs)
+        if not _storable(request, response):
+            return _uncached(request, response, csrf)
+        entry = _entry(response, csrf)
+        await pages.aset(key, entry, settings.PAGE_CACHE_TIMEOUT)
+        return _respond(request, entry, 'miss')
+    return wrapper
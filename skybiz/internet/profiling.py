@@ -0,0 +1,181 @@
+"""Where a request's time went: database, templates, external calls.
+
+A Profile is active for every request (see ProfilingMiddleware) and for
+the background jobs that talk to Twilio, SMTP and speedtest servers. Code
+marks its slow parts with ``with phase('smtp'):``; queries are timed by an
+execute wrapper and templates by the template backend below. Each phase
+only counts its own time, so queries run while a template renders count
+as db, not template, and whatever is left over is reported as app.
+
+A PROFILING_SAMPLE_RATE fraction of profiles is kept in a ring buffer of
+PROFILING_BUFFER_SIZE slots in the 'profiling' cache, shared by every
+worker, so the admin dashboard can list the slowest of them. It has a
+cache of its own so its slots never crowd out the default cache.
+"""
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates, Template as BaseTemplate, reraise
+from django.template.exceptions import TemplateDoesNotExist
+from django.utils import timezone
+
+CURSOR_KEY = 'profiling:cursor'
+SLOT_KEY = 'profiling:slot:{}'
+RECORD_TTL = 24 * 60 * 60
+
+_current = ContextVar('profile', default=None)
+
+
+class Profile:
+    """Time spent per phase while it is active."""
+
+    def __init__(self, name, kind='request'):
+        self.name = name
+        self.kind = kind
+        self.phases = {}
+        self.queries = 0
+        self.start = time.perf_counter()
+        self.total = None
+        self._nested = []
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+            self.total = time.perf_counter() - self.start
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - nested
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper
+        self.queries += 1
+        with self.phase('db'):
+            return execute(sql, params, many, context)
+
+    def breakdown(self):
+        """{phase: milliseconds}, with the unaccounted time as 'app'."""
+        total = self.total if self.total is not None else time.perf_counter() - self.start
+        phases = {name: round(seconds * 1000, 2) for name, seconds in self.phases.items()}
+        phases['app'] = round(max(total - sum(self.phases.values()), 0) * 1000, 2)
+        return phases
+
+    def server_timing(self):
+        parts = []
+        for name, ms in self.breakdown().items():
+            desc = f';desc="{self.queries} queries"' if name == 'db' else ''
+            parts.append(f'{name};dur={ms}{desc}')
+        parts.append(f'total;dur={self.total * 1000:.2f}')
+        return ', '.join(parts)
+
+    def entry(self, **extra):
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'at': timezone.now(),
+            'total_ms': round(self.total * 1000, 2),
+            'queries': self.queries,
+            'phases': self.breakdown(),
+            **extra,
+        }
+
+
+@contextmanager
+def phase(name):
+    """Count the block as ``name`` in the active profile, if there is one."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.phase(name):
+        yield
+
+
+def wrap_connections(wrapper):
+    """Install execute ``wrapper`` on this thread's connections until the stack closes."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+def sampled():
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def buffer():
+    return caches['profiling']
+
+
+def record(entry):
+    """Write ``entry`` to the next ring buffer slot."""
+    cache = buffer()
+    try:
+        position = cache.incr(CURSOR_KEY)
+    except ValueError:
+        position = 0
+        cache.set(CURSOR_KEY, position, None)
+    cache.set(SLOT_KEY.format(position % settings.PROFILING_BUFFER_SIZE), entry, RECORD_TTL)
+
+
+async def arecord(entry):
+    cache = buffer()
+    try:
+        position = await cache.aincr(CURSOR_KEY)
+    except ValueError:
+        position = 0
+        await cache.aset(CURSOR_KEY, position, None)
+    await cache.aset(SLOT_KEY.format(position % settings.PROFILING_BUFFER_SIZE), entry, RECORD_TTL)
+
+
+def slowest(limit=10):
+    """The slowest entries in the ring buffer, slowest first."""
+    entries = buffer().get_many([SLOT_KEY.format(slot) for slot in range(settings.PROFILING_BUFFER_SIZE)])
+    return sorted(entries.values(), key=lambda entry: entry['total_ms'], reverse=True)[:limit]
+
+
+@contextmanager
+def track(name, kind='job'):
+    """Profile a background job and record it when sampled."""
+    profile = Profile(name, kind)
+    with profile.activate(), wrap_connections(profile):
+        yield profile
+    if sampled():
+        record(profile.entry())
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        with phase('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """The Django template backend, with rendering timed as the template phase."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,80 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import ContactMessage, BusinessQuoteRequest, SpeedTestResult
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# Models that can be purged and the field their age is measured on
+PURGEABLE = {
+    'speed_tests': (SpeedTestResult, 'timestamp'),
+    'messages': (ContactMessage, 'created_at'),
+    'business_requests': (BusinessQuoteRequest, 'created_at'),
+}
+
+
+def purge(queryset, batch_size=BATCH_SIZE, dry_run=False, progress=None, update_rollups=True):
+    """Delete the rows of ``queryset`` in primary key batches.
+
+    Every batch is its own short transaction, so locks are held briefly
+    and a huge delete never builds one giant transaction. ``progress`` is
+    called with the running total after each batch. Deleted speed tests
+    are taken out of the rollups in the same transaction unless
+    ``update_rollups`` is False. Returns the number of rows deleted (or
+    that would be deleted with ``dry_run``).
+    """
+    if dry_run:
+        return queryset.count()
+
+    model = queryset.model
+    deleted = 0
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        with transaction.atomic():
+            if model is SpeedTestResult and update_rollups:
+                rollups.remove_results(model.objects.filter(pk__in=pks))
+            _, per_model = model.objects.filter(pk__in=pks).delete()
+        deleted += per_model.get(model._meta.label, 0)
+        last_pk = pks[-1]
+        if progress:
+            progress(deleted)
+    return deleted
+
+
+def retention_days():
+    return getattr(settings, 'RETENTION_DAYS', {})
+
+
+def expired(name, days=None):
+    """Queryset of rows in ``name`` older than its retention period."""
+    model, field = PURGEABLE[name]
+    days = days if days is not None else retention_days().get(name)
+    if days is None:
+        return model.objects.none()
+    cutoff = timezone.now() - timedelta(days=days)
+    return model.objects.filter(**{f'{field}__lt': cutoff})
+
+
+def apply_retention(batch_size=BATCH_SIZE, dry_run=False, progress=None):
+    """Purge everything past RETENTION_DAYS. Returns {name: rows deleted}."""
+    results = {}
+    for name in PURGEABLE:
+        if name not in retention_days():
+            continue
+        report = (lambda n, name=name: progress(name, n)) if progress else None
+        results[name] = purge(expired(name), batch_size=batch_size, dry_run=dry_run, progress=report)
+        logger.info(f"Retention purge of {name}: {results[name]} rows{' (dry run)' if dry_run else ''}")
+    return results
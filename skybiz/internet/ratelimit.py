@@ -0,0 +1,123 @@
+"""Per-IP rate limits and admission control for the expensive endpoints.
+
+Each (endpoint, client IP) pair has a token bucket in the shared cache,
+sized by RATE_LIMITS; a request takes one token or gets a 429 with
+Retry-After. Buckets are read and written without a cross-process lock,
+so workers racing on the same bucket can let a few extra requests through
+(at most one per worker), which is fine for abuse control.
+
+Server-side speed tests also need one of SPEEDTEST_GLOBAL_CONCURRENCY
+slots, shared by every worker. Slots are cache leases, so a worker that
+dies mid-test gives its slot back when the lease runs out.
+
+Allowed and limited decisions are counted in the cache (see stats()).
+"""
+import logging
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = 'ratelimit:bucket:{}:{}'
+STATS_KEY = 'ratelimit:stats:{}:{}'
+SLOT_KEY = 'ratelimit:speedtest:slot:{}'
+SLOTS = 'speedtest_slots'
+DECISIONS = ('allowed', 'limited')
+
+_lock = threading.Lock()
+
+
+def client_ip(request):
+    """REMOTE_ADDR, or the address RATE_LIMIT_PROXY_COUNT proxies forwarded."""
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    if proxies:
+        forwarded = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', 'unknown')
+
+
+def record(name, decision):
+    key = STATS_KEY.format(name, decision)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def take(endpoint, ip, now=None):
+    """Take a token from the bucket. Returns 0 if allowed, else seconds to wait."""
+    capacity, period = settings.RATE_LIMITS[endpoint]
+    rate = capacity / period
+    now = time.time() if now is None else now
+    key = BUCKET_KEY.format(endpoint, ip)
+    with _lock:
+        # A missing bucket is a full one; it expires once it would be full again
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            cache.set(key, (tokens - 1, now), period)
+            wait = 0
+        else:
+            wait = math.ceil(round((1 - tokens) / rate, 3))
+    record(endpoint, 'limited' if wait else 'allowed')
+    if wait:
+        logger.info(f"Rate limited {ip} on {endpoint} for {wait}s")
+    return wait
+
+
+def too_many_requests(retry_after, json=False):
+    message = f'Too many requests, please try again in {retry_after} seconds.'
+    if json:
+        response = JsonResponse({'success': False, 'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(endpoint, methods=('POST',), json=False):
+    """Limit ``methods`` on the view by client IP with the RATE_LIMITS[endpoint] bucket."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods and endpoint in settings.RATE_LIMITS:
+                wait = take(endpoint, client_ip(request))
+                if wait:
+                    return too_many_requests(wait, json)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def acquire_slot(owner):
+    """Claim a global speed test slot. Returns its number, or None when all are taken."""
+    for slot in range(settings.SPEEDTEST_GLOBAL_CONCURRENCY):
+        if cache.add(SLOT_KEY.format(slot), owner, settings.SPEEDTEST_SLOT_LEASE):
+            record(SLOTS, 'allowed')
+            return slot
+    record(SLOTS, 'limited')
+    return None
+
+
+def release_slot(slot):
+    cache.delete(SLOT_KEY.format(slot))
+
+
+def stats():
+    names = [*settings.RATE_LIMITS, SLOTS]
+    keys = [STATS_KEY.format(name, decision) for name in names for decision in DECISIONS]
+    counts = cache.get_many(keys)
+    result = {
+        name: {decision: counts.get(STATS_KEY.format(name, decision), 0) for decision in DECISIONS}
+        for name in names
+    }
+    slots = [SLOT_KEY.format(slot) for slot in range(settings.SPEEDTEST_GLOBAL_CONCURRENCY)]
+    result[SLOTS].update(in_use=len(cache.get_many(slots)), limit=settings.SPEEDTEST_GLOBAL_CONCURRENCY)
+    return result
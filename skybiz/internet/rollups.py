@@ -0,0 +1,148 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import SpeedTestDailyRollup, SpeedTestHourlyRollup, SpeedTestResult
+
+METRICS = {
+    'download': 'download_speed',
+    'upload': 'upload_speed',
+    'latency': 'latency',
+}
+
+
+def hour_bucket(ts):
+    return timezone.localtime(ts).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(ts):
+    return timezone.localtime(ts).date()
+
+
+def add_result(result):
+    """Fold a newly saved SpeedTestResult into its hourly and daily rollups."""
+    with transaction.atomic():
+        _add_to(SpeedTestHourlyRollup, hour_bucket(result.timestamp), result)
+        _add_to(SpeedTestDailyRollup, day_bucket(result.timestamp), result)
+
+
+def _add_to(model, bucket, result):
+    model.objects.get_or_create(bucket=bucket)
+    updates = {'count': F('count') + 1}
+    for metric, field in METRICS.items():
+        value = getattr(result, field)
+        v = Value(value, output_field=FloatField())
+        updates[f'{metric}_sum'] = F(f'{metric}_sum') + value
+        updates[f'{metric}_sq_sum'] = F(f'{metric}_sq_sum') + value * value
+        updates[f'{metric}_min'] = Least(Coalesce(F(f'{metric}_min'), v), v)
+        updates[f'{metric}_max'] = Greatest(Coalesce(F(f'{metric}_max'), v), v)
+    model.objects.filter(bucket=bucket).update(**updates)
+
+
+def _aggregates(bounds=True):
+    aggregates = {'count': Count('id')}
+    for metric, field in METRICS.items():
+        aggregates[f'{metric}_sum'] = Sum(field)
+        aggregates[f'{metric}_sq_sum'] = Sum(F(field) * F(field))
+        if bounds:
+            aggregates[f'{metric}_min'] = Min(field)
+            aggregates[f'{metric}_max'] = Max(field)
+    return aggregates
+
+
+def _buckets():
+    tz = timezone.get_current_timezone()
+    return ((SpeedTestHourlyRollup, TruncHour('timestamp', tzinfo=tz)),
+            (SpeedTestDailyRollup, TruncDate('timestamp', tzinfo=tz)))
+
+
+def remove_results(queryset):
+    """Take the SpeedTestResults in ``queryset`` out of their rollups before they are deleted.
+
+    Counts and sums are subtracted and buckets left empty are removed. The
+    min and max of a bucket that still has tests are kept, so they remain
+    bounds rather than exact values.
+    """
+    with transaction.atomic():
+        for model, trunc in _buckets():
+            rows = queryset.order_by().annotate(bucket=trunc).values('bucket').annotate(**_aggregates(bounds=False))
+            for row in rows:
+                updates = {'count': Greatest(F('count') - row.pop('count'), 0)}
+                bucket = row.pop('bucket')
+                updates.update({field: F(field) - value for field, value in row.items()})
+                model.objects.filter(bucket=bucket).update(**updates)
+            model.objects.filter(count=0).delete()
+
+
+def rebuild(batch_size=1000):
+    """Recompute every rollup from the raw SpeedTestResult table.
+
+    Returns the number of (hourly, daily) buckets written.
+    """
+    written = []
+    with transaction.atomic():
+        for model, trunc in _buckets():
+            model.objects.all().delete()
+            rows = (
+                SpeedTestResult.objects.order_by()
+                .annotate(bucket=trunc)
+                .values('bucket')
+                .annotate(**_aggregates())
+                .order_by('bucket')
+            )
+            rollups = (model(**row) for row in rows.iterator())
+            count = 0
+            while True:
+                batch = list(islice(rollups, batch_size))
+                if not batch:
+                    break
+                model.objects.bulk_create(batch)
+                count += len(batch)
+            written.append(count)
+    return tuple(written)
+
+
+def clear():
+    SpeedTestHourlyRollup.objects.all().delete()
+    SpeedTestDailyRollup.objects.all().delete()
+
+
+def totals():
+    """Overall count and averages, computed from the daily rollups."""
+    sums = SpeedTestDailyRollup.objects.aggregate(
+        count=Coalesce(Sum('count'), 0),
+        download_sum=Coalesce(Sum('download_sum'), 0.0),
+        upload_sum=Coalesce(Sum('upload_sum'), 0.0),
+        latency_sum=Coalesce(Sum('latency_sum'), 0.0),
+    )
+    count = sums['count']
+    return {
+        'count': count,
+        'avg_download': sums['download_sum'] / count if count else 0,
+        'avg_upload': sums['upload_sum'] / count if count else 0,
+        'avg_latency': sums['latency_sum'] / count if count else 0,
+    }
+
+
+def daily_series(start, end, metric='download'):
+    """Average of ``metric`` per day from ``start`` to ``end`` inclusive.
+
+    Days without tests are reported as 0. Returns (labels, data).
+    """
+    rollups = {
+        r.bucket: r
+        for r in SpeedTestDailyRollup.objects.filter(bucket__gte=start, bucket__lte=end)
+    }
+    labels = []
+    data = []
+    day = start
+    while day <= end:
+        labels.append(day.strftime('%Y-%m-%d'))
+        rollup = rollups.get(day)
+        data.append(round(rollup.average(metric), 2) if rollup else 0)
+        day += timedelta(days=1)
+    return labels, data
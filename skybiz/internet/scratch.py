@@ -0,0 +1,52 @@
+"""Throwaway state for the commands that seed data and request every page.
+
+explain_views, loadtest and benchmark_queries seed rows inside a
+transaction they roll back by raising Rollback, and run under
+scratch_state() so the caches and metrics they touch are thrown away too.
+ROUTE_KWARGS supplies arguments for the routes that need them.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from . import metrics
+from .admin_sections import SECTIONS
+
+# URL kwargs for routes that take arguments
+ROUTE_KWARGS = {
+    'admin_section': [{'section': name} for name in SECTIONS],
+    'admin_reply_job': [{'job_id': 'missing'}],
+    'home_speed_test_status': [{'job_id': 'missing'}],
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def scratch_state():
+    """Use throwaway caches and METRICS_DIR for the block.
+
+    Rolling back seeded rows does not undo what rendering pages wrote to
+    the caches (the ticker fragment, cached pages, the catalog version) or
+    the requests counted in the metrics. File caches stay file caches, in
+    a temporary directory, so timings stay representative.
+    """
+    directory = tempfile.mkdtemp(prefix='skybiz-scratch-')
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'] == 'django.core.cache.backends.filebased.FileBasedCache':
+            caches[alias] = {**config, 'LOCATION': os.path.join(directory, 'cache', alias)}
+        else:
+            caches[alias] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'scratch-{alias}'}
+    try:
+        with override_settings(CACHES=caches, METRICS_DIR=os.path.join(directory, 'metrics')):
+            yield
+    finally:
+        metrics.reset()
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,269 @@
+"""Bulk synthetic data for query plan checks, load tests and benchmarks.
+
+seed() generates a dataset shaped like a busy site: users who joined over
+the last ``days``, subscribed mostly to the cheaper plans, and speed tests
+that grow towards the present, peak in the evening and cluster around each
+user's plan speed, with messages and quote requests trickling in alongside.
+
+Rows are streamed in batches so millions of them never sit in memory at
+once. PostgreSQL loads them with COPY, other databases with bulk_create.
+Generated timestamps are kept. Bulk loading skips model signals, so callers
+rebuild the rollups and bump the caches afterwards.
+"""
+import io
+import math
+import random
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from . import catalog, page_cache, rollups, ticker
+from .models import Package, ContactMessage, BusinessQuoteRequest, UserProfile, SpeedTestResult, Branch, NewsTicker
+
+BATCH_SIZE = 1000
+COPY_BATCH_SIZE = 50_000
+
+# Speed test rows per scale tier; the other tables scale with it (see counts())
+TIERS = {
+    'small': 10_000,
+    'medium': 100_000,
+    'large': 1_000_000,
+    'xlarge': 5_000_000,
+}
+
+# Plan download speeds in Mbps, and how many subscribers each one gets
+PLANS = [10, 20, 30, 50, 100, 200, 500]
+PLAN_WEIGHTS = [8, 20, 22, 20, 16, 9, 5]
+# Share of the day's speed tests started in each hour
+HOURLY_WEIGHTS = [3, 2, 1, 1, 1, 1, 2, 3, 4, 4, 4, 4, 5, 5, 4, 4, 5, 6, 8, 10, 11, 10, 7, 5]
+HOURLY_CUMULATIVE = list(accumulate(HOURLY_WEIGHTS))
+EVENING = range(19, 23)
+
+CITIES = ['Dhaka', 'Chattogram', 'Khulna', 'Rajshahi', 'Sylhet', 'Barishal', 'Rangpur', 'Mymensingh', 'Cumilla', 'Gazipur']
+SUBJECTS = ['Connection', 'Billing', 'New connection', 'Package upgrade', 'Slow speed', 'Relocation']
+BANDWIDTHS = ['50 Mbps', '100 Mbps', '200 Mbps', '500 Mbps', '1 Gbps']
+BANDWIDTH_WEIGHTS = [30, 35, 15, 12, 8]
+
+
+def counts(speed_tests):
+    return {
+        'packages': 40,
+        'users': max(speed_tests // 50, 1),
+        'speed_tests': speed_tests,
+        'messages': max(speed_tests // 200, 1),
+        'business_requests': max(speed_tests // 500, 1),
+        'branches': 60,
+        'news': 200,
+    }
+
+
+def _batches(objects, size):
+    objects = iter(objects)
+    while batch := list(islice(objects, size)):
+        yield batch
+
+
+@contextmanager
+def _keep_timestamps(model):
+    # auto_now/auto_now_add would stamp every generated row with the current time
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.concrete_fields if isinstance(field, models.DateField)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _copy_value(value):
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', r'\t').replace('\n', r'\n').replace('\r', r'\r')
+
+
+def _copy(model, objects):
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    sql = (
+        f'COPY {quote(model._meta.db_table)} ({", ".join(quote(field.column) for field in fields)}) '
+        f'FROM STDIN'
+    )
+    count = 0
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        for batch in _batches(objects, COPY_BATCH_SIZE):
+            buffer = io.StringIO()
+            for obj in batch:
+                buffer.write('\t'.join(
+                    _copy_value(field.get_db_prep_save(field.pre_save(obj, True), connection))
+                    for field in fields
+                ))
+                buffer.write('\n')
+            buffer.seek(0)
+            if hasattr(raw, 'copy_expert'):
+                raw.copy_expert(sql, buffer)
+            else:
+                # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+            count += len(batch)
+    return count
+
+
+def load(model, objects):
+    """Insert ``objects`` (any iterable) keeping their timestamps. Returns the row count."""
+    with _keep_timestamps(model), transaction.atomic():
+        if connection.vendor == 'postgresql':
+            return _copy(model, objects)
+        count = 0
+        for batch in _batches(objects, BATCH_SIZE * 10):
+            model.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+            count += len(batch)
+        return count
+
+
+def _moment(rng, now, days):
+    # Traffic grows towards the present and peaks in the evening
+    day = timezone.localdate(now) - timedelta(days=int(days * (1 - math.sqrt(rng.random()))))
+    hour = bisect(HOURLY_CUMULATIVE, rng.random() * HOURLY_CUMULATIVE[-1])
+    moment = timezone.make_aware(datetime.combine(day, time(hour))) + timedelta(seconds=rng.random() * 3600)
+    return moment - timedelta(days=1) if moment > now else moment
+
+
+def _speed_test(rng, now, days, user_id, plan, ip_address):
+    timestamp = _moment(rng, now, days)
+    evening = timezone.localtime(timestamp).hour in EVENING
+    if rng.random() < 0.03:
+        # Bad Wi-Fi, a saturated link or a test from the wrong side of the world
+        download = rng.uniform(0.5, 3)
+    else:
+        download = plan * min(rng.lognormvariate(-0.15, 0.25), 1.1) * (0.8 if evening else 1)
+    return SpeedTestResult(
+        user_id=user_id,
+        download_speed=round(download, 2),
+        upload_speed=round(download * rng.uniform(0.4, 1.0), 2),
+        latency=round(rng.lognormvariate(math.log(18), 0.5) * (1.3 if evening else 1), 2),
+        ip_address=ip_address,
+        timestamp=timestamp,
+    )
+
+
+def seed(speed_tests=50_000, days=365, now=None):
+    """Insert a dataset shaped like a busy site, sized by ``speed_tests``.
+
+    Returns {table: rows created}.
+    """
+    rng = random.Random(0)
+    now = now or timezone.now()
+    sizes = counts(speed_tests)
+
+    def joined():
+        return now - timedelta(seconds=rng.random() * days * 86400)
+
+    plans = {}
+    first_package = (Package.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+
+    def package(i):
+        speed = PLANS[i % len(PLANS)]
+        created = joined()
+        return Package(
+            name=f'Seed {speed} Mbps {i}', package_type='business' if i % 4 == 0 else 'residential',
+            download_speed=speed, upload_speed=speed // 2 if speed > 50 else speed,
+            price=round(300 + speed * 9 + rng.randint(0, 20) * 50),
+            data_limit='Unlimited', features='BDIX,24/7 support', is_popular=i % 8 == 0,
+            created_at=created, updated_at=created,
+        )
+
+    load(Package, (package(i) for i in range(sizes['packages'])))
+    for package_id, speed in Package.objects.filter(id__gte=first_package).values_list('id', 'download_speed'):
+        plans.setdefault(speed, []).append(package_id)
+
+    last_id = User.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    load(User, (
+        User(
+            username=f'seed{last_id + i}', email=f'seed{last_id + i}@example.com',
+            password='!', is_active=rng.random() < 0.9, date_joined=joined(),
+        )
+        for i in range(sizes['users'])
+    ))
+    user_ids = list(User.objects.filter(id__gt=last_id).values_list('id', flat=True))
+
+    subscribers = []
+
+    def profile(user_id):
+        speed = rng.choices(PLANS, PLAN_WEIGHTS)[0]
+        package_id = rng.choice(plans[speed]) if speed in plans and rng.random() < 0.7 else None
+        subscribers.append((user_id, speed if package_id else None))
+        return UserProfile(user_id=user_id, package_id=package_id)
+
+    load(UserProfile, (profile(user_id) for user_id in user_ids))
+
+    def speed_test():
+        if rng.random() < 0.6:
+            user_id, plan = rng.choice(subscribers)
+            ip_address = f'10.{user_id >> 16 & 255}.{user_id >> 8 & 255}.{user_id & 255}'
+        else:
+            user_id, plan = None, None
+            ip_address = f'103.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+        plan = plan or rng.choices(PLANS, PLAN_WEIGHTS)[0]
+        return _speed_test(rng, now, days, user_id, plan, ip_address)
+
+    load(SpeedTestResult, (speed_test() for _ in range(speed_tests)))
+
+    def message(i):
+        created = _moment(rng, now, days)
+        # Older messages are more likely to have been answered
+        answered = 0.9 if now - created > timedelta(days=2) else 0.3
+        return ContactMessage(
+            name=f'Visitor {i}', email=f'visitor{i}@example.com', subject=rng.choice(SUBJECTS),
+            message='My connection drops every evening.\nPlease call me back.',
+            reply_sent=rng.random() < answered, created_at=created,
+        )
+
+    load(ContactMessage, (message(i) for i in range(sizes['messages'])))
+    load(BusinessQuoteRequest, (
+        BusinessQuoteRequest(
+            company_name=f'Company {i}', contact_person=f'Contact {i}', email=f'company{i}@example.com',
+            phone=f'01{rng.randint(300000000, 999999999)}',
+            bandwidth=rng.choices(BANDWIDTHS, BANDWIDTH_WEIGHTS)[0], requirements='Dedicated line',
+            created_at=_moment(rng, now, days),
+        )
+        for i in range(sizes['business_requests'])
+    ))
+
+    def branch(i):
+        created = joined()
+        city = CITIES[i % len(CITIES)]
+        return Branch(
+            name=f'Branch {i}', address=f'Road {i}', city=city, state=city,
+            phone='0123456789', email=f'branch{i}@example.com', is_active=i % 5 != 0,
+            created_at=created, updated_at=created,
+        )
+
+    load(Branch, (branch(i) for i in range(sizes['branches'])))
+
+    def news(i):
+        created = joined()
+        return NewsTicker(message=f'Seed news {i}', is_active=i % 10 == 0, created_at=created, updated_at=created)
+
+    load(NewsTicker, (news(i) for i in range(sizes['news'])))
+    return sizes
+
+
+def refresh():
+    """Rebuild the rollups and caches that bulk loading bypassed."""
+    rollups.rebuild()
+    catalog.bump()
+    ticker.invalidate()
+    page_cache.invalidate()
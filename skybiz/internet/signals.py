@@ -0,0 +1,47 @@
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import catalog, db_pool, page_cache, rollups, ticker
+from .models import Package, SpeedTestResult, NewsTicker, Branch
+
+
+@receiver(post_save, sender=SpeedTestResult)
+def update_speedtest_rollups(sender, instance, created, **kwargs):
+    if created:
+        rollups.add_result(instance)
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+def bump_catalog_version(sender, **kwargs):
+    # After commit, so no worker can reload the old rows under the new version
+    transaction.on_commit(catalog.bump)
+
+
+@receiver(post_save, sender=NewsTicker)
+@receiver(post_delete, sender=NewsTicker)
+def invalidate_news_ticker(sender, **kwargs):
+    transaction.on_commit(ticker.invalidate)
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+@receiver(post_save, sender=NewsTicker)
+@receiver(post_delete, sender=NewsTicker)
+def invalidate_page_cache(sender, **kwargs):
+    transaction.on_commit(page_cache.invalidate)
+
+
+@receiver(request_started)
+def count_request(sender, **kwargs):
+    db_pool.record('requests')
+
+
+@receiver(connection_created)
+def count_connection(sender, **kwargs):
+    db_pool.record('connections_opened')
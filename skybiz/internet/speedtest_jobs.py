@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from . import metrics, profiling, ratelimit, speedtest_servers
+from .models import SpeedTestResult
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'speedtest:job:{}'
+JOB_TTL = 60 * 60  # keep finished jobs around for an hour
+
+
+class QueueFull(Exception):
+    """No room for another speed test in this worker or across the site."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SPEEDTEST_MAX_CONCURRENCY', 2),
+                thread_name_prefix='speedtest',
+            )
+        return _executor
+
+
+def get_job(job_id):
+    return cache.get(JOB_KEY.format(job_id))
+
+
+async def aget_job(job_id):
+    return await cache.aget(JOB_KEY.format(job_id))
+
+
+def _update_job(job_id, **fields):
+    job = get_job(job_id) or {'id': job_id}
+    job.update(fields)
+    job['updated_at'] = time.time()
+    cache.set(JOB_KEY.format(job_id), job, JOB_TTL)
+    return job
+
+
+def enqueue_speed_test(user_id=None, ip_address=None):
+    """Queue a speed test and return its job id straight away.
+
+    Raises QueueFull when more than SPEEDTEST_MAX_QUEUED tests are already
+    waiting or running in this worker, or every global slot is taken.
+    """
+    global _pending
+    max_queued = getattr(settings, 'SPEEDTEST_MAX_QUEUED', 10)
+    with _executor_lock:
+        if _pending >= max_queued:
+            raise QueueFull()
+        _pending += 1
+
+    job_id = uuid.uuid4().hex
+    slot = None
+    submitted = False
+    try:
+        slot = ratelimit.acquire_slot(job_id)
+        if slot is None:
+            raise QueueFull()
+        _update_job(job_id, status='queued', phase=None, created_at=time.time())
+        _get_executor().submit(_run_job, job_id, user_id, ip_address, slot)
+        submitted = True
+    finally:
+        # Once submitted, _run_job gives the slots back
+        if not submitted:
+            _release_slot(slot)
+    return job_id
+
+
+def _release_slot(slot=None):
+    global _pending
+    with _executor_lock:
+        _pending -= 1
+    if slot is not None:
+        ratelimit.release_slot(slot)
+
+
+@profiling.track('speed test job')
+def _run_job(job_id, user_id, ip_address, slot=None):
+    close_old_connections()
+    try:
+        _update_job(job_id, status='running', phase='servers')
+        # speedtest-cli is slow to import and only needed here
+        import speedtest
+        with profiling.phase('speedtest'), metrics.speedtest_phase('server_selection'):
+            s = speedtest.Speedtest()
+            speedtest_servers.prepare(s)
+
+        _update_job(job_id, phase='download')
+        with profiling.phase('speedtest'), metrics.speedtest_phase('download'):
+            download = round(s.download() / 1_000_000, 2)
+        _update_job(job_id, phase='upload')
+        with profiling.phase('speedtest'), metrics.speedtest_phase('upload'):
+            upload = round(s.upload() / 1_000_000, 2)
+        ping = round(s.results.ping, 1)
+
+        server = s.results.server
+
+        # Save result
+        SpeedTestResult.objects.create(
+            user_id=user_id,
+            download_speed=download,
+            upload_speed=upload,
+            latency=ping,
+            ip_address=ip_address,
+        )
+
+        _update_job(job_id, status='done', phase=None, result={
+            'download': download,
+            'upload': upload,
+            'ping': ping,
+            'server': server.get('sponsor', 'Local Server'),
+            'location': f"{server.get('name', '')}, {server.get('country', '')}",
+        })
+    except Exception as e:
+        logger.error(f"Speed test {job_id} failed: {e}")
+        _update_job(job_id, status='failed', phase=None, error='No internet connection detected')
+    finally:
+        close_old_connections()
+        _release_slot(slot)
@@ -0,0 +1,60 @@
+import os
+import threading
+
+from django.conf import settings
+
+CHUNK_SIZE = 256 * 1024
+MAX_DOWNLOAD_SIZE = 100 * 1024 * 1024
+MAX_UPLOAD_SIZE = MAX_DOWNLOAD_SIZE
+
+_chunks = None
+_chunks_lock = threading.Lock()
+
+
+def payload_chunks():
+    """Random, incompressible chunks shared by every download response.
+
+    They are generated once per worker process. WSGI servers only accept
+    ``bytes`` and Django passes ``bytes`` through untouched, so responses
+    reuse these objects and no data is copied per chunk.
+    """
+    global _chunks
+    if _chunks is None:
+        with _chunks_lock:
+            if _chunks is None:
+                size = getattr(settings, 'SPEEDTEST_PAYLOAD_SIZE', 8 * 1024 * 1024)
+                _chunks = [os.urandom(CHUNK_SIZE) for _ in range(max(1, size // CHUNK_SIZE))]
+    return _chunks
+
+
+def stream_payload(size):
+    chunks = payload_chunks()
+    sent = 0
+    i = 0
+    while sent < size:
+        chunk = chunks[i % len(chunks)]
+        if size - sent < len(chunk):
+            chunk = chunk[:size - sent]
+        yield chunk
+        sent += len(chunk)
+        i += 1
+
+
+def drain_upload(request, limit=None):
+    """Read and discard the request body in fixed-size chunks.
+
+    Returns the number of bytes read, or None as soon as the body goes
+    past ``limit`` (MAX_UPLOAD_SIZE by default); the rest of it is left
+    unread.
+    """
+    if limit is None:
+        limit = MAX_UPLOAD_SIZE
+    received = 0
+    while True:
+        chunk = request.read(min(CHUNK_SIZE, limit + 1 - received))
+        if not chunk:
+            break
+        received += len(chunk)
+        if received > limit:
+            return None
+    return received
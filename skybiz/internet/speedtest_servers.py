@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+SERVERS_KEY = 'speedtest:servers'
+REFRESH_LOCK_KEY = 'speedtest:servers:refreshing'
+# speedtest-cli scores a failed ping as 3600 seconds
+UNREACHABLE_MS = 60 * 1000
+
+
+def cache_ttl():
+    return getattr(settings, 'SPEEDTEST_SERVER_CACHE_TTL', 6 * 60 * 60)
+
+
+def get_entry():
+    return cache.get(SERVERS_KEY)
+
+
+def refresh(s=None):
+    """Fetch the server list, ping the closest servers and store the winner.
+
+    The entry is stored without an expiry so the last good one is always
+    there to fall back on; freshness is tracked through ``fetched_at``.
+    """
+    if s is None:
+        import speedtest
+        s = speedtest.Speedtest()
+    with profiling.phase('speedtest'):
+        s.get_servers()
+        best = s.get_best_server()
+    entry = {
+        'closest': s.closest,
+        'best': best,
+        'fetched_at': time.time(),
+    }
+    cache.set(SERVERS_KEY, entry, None)
+    logger.info(f"Speed test server cache refreshed, best server {best.get('sponsor')}")
+    return entry
+
+
+def _refresh_in_background():
+    # Only one worker process refreshes at a time
+    if not cache.add(REFRESH_LOCK_KEY, True, 5 * 60):
+        return
+
+    def run():
+        try:
+            refresh()
+        except Exception as e:
+            logger.error(f"Speed test server refresh failed, keeping last good entry: {e}")
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+
+    threading.Thread(target=run, name='speedtest-servers', daemon=True).start()
+
+
+def prepare(s):
+    """Point ``s`` at the cached best server, skipping server discovery.
+
+    Only the chosen server is pinged so the reported latency stays fresh.
+    The entry is refreshed in the background once it is 80% through its TTL.
+    """
+    entry = get_entry()
+    if entry is None:
+        entry = refresh(s)
+        return s.results.server
+    if time.time() - entry['fetched_at'] > cache_ttl() * 0.8:
+        _refresh_in_background()
+    with profiling.phase('speedtest'):
+        s.get_best_server([entry['best']])
+    if s.results.ping > UNREACHABLE_MS:
+        # Cached server stopped answering, pick a new one right away
+        refresh(s)
+    return s.results.server
@@ -0,0 +1,53 @@
+"""Measure how long a fresh interpreter takes to load the site.
+
+Workers and management commands pay this on every start, so keep heavy
+optional libraries out of module level imports (see HEAVY_MODULES).
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+# Imported lazily where they are used; loading the site must not pull them in
+HEAVY_MODULES = ('twilio', 'speedtest', 'requests', 'numpy')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def _run(args):
+    env = os.environ.copy()
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'skybiz.settings')
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args], cwd=settings.BASE_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return result, time.perf_counter() - start
+
+
+def profile_imports(target='internet.urls'):
+    """Import ``target`` after django.setup() in a new interpreter.
+
+    Returns (wall seconds, {module: (self µs, cumulative µs)}) as reported
+    by ``python -X importtime``.
+    """
+    result, wall = _run(['-X', 'importtime', '-c', f'import django; django.setup(); import {target}'])
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules.setdefault(match.group(4), (int(match.group(1)), int(match.group(2))))
+    return wall, modules
+
+
+def heavy_imports(modules):
+    return sorted(name for name in modules if name.split('.')[0] in HEAVY_MODULES)
+
+
+def time_command(*args):
+    """Wall time of ``manage.py <args>`` in a new interpreter."""
+    _, wall = _run(['manage.py', *args])
+    return wall
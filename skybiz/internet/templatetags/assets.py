@@ -0,0 +1,11 @@
+from django import template
+
+from internet import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def asset_available(path):
+    """{% asset_available 'build/app.css' as built %} for CDN fallbacks."""
+    return assets.available(path)
@@ -0,0 +1,42 @@
+"""Test runner that keeps the suite away from the site's shared state.
+
+Every cache alias becomes a per-process locmem cache and METRICS_DIR a
+temporary directory, so running the tests neither wipes a developer's
+file cache nor adds to their Prometheus counters. Tests call
+clear_caches() in setUp to start from empty caches.
+"""
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import metrics
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_dir = tempfile.mkdtemp(prefix='skybiz-test-metrics-')
+        self.isolated = override_settings(
+            CACHES={
+                alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+                for alias in settings.CACHES
+            },
+            METRICS_DIR=self.metrics_dir,
+        )
+        self.isolated.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        # Otherwise the exit flush writes the suite's counters to the real METRICS_DIR
+        metrics.reset()
+        self.isolated.disable()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,91 @@
+"""Pre-rendered news ticker shown at the top of every page.
+
+Active news is rendered once into an HTML fragment and kept in the shared
+cache with an ETag. The key includes a generation number that editing news
+bumps (see signals.py), so a fragment rendered from the old rows while the
+edit committed is never served; news with a display window makes the
+fragment expire at the next start or end time, so it appears and
+disappears on schedule without a query per page.
+"""
+import hashlib
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from . import metrics
+from .models import NewsTicker
+
+GENERATION_KEY = 'ticker:generation'
+FRAGMENT_KEY = 'ticker:fragment:{}'
+# Fragments of old generations are never read again; let them go
+MAX_TIMEOUT = 24 * 60 * 60
+
+
+def generation():
+    current = cache.get(GENERATION_KEY)
+    if current is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        current = cache.get(GENERATION_KEY)
+    return current
+
+
+async def ageneration():
+    current = await cache.aget(GENERATION_KEY)
+    if current is None:
+        await cache.aadd(GENERATION_KEY, time.time_ns(), None)
+        current = await cache.aget(GENERATION_KEY)
+    return current
+
+
+def render(now=None):
+    """Render the fragment. Returns ({'html', 'etag'}, seconds it stays valid)."""
+    now = now or timezone.now()
+    items = list(
+        NewsTicker.objects.filter(is_active=True)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+        .only('message', 'is_active', 'starts_at', 'ends_at')
+    )
+    html = render_to_string('news_ticker.html', {'items': [n for n in items if n.is_showing(now)]})
+    changes = [
+        t for n in items for t in (n.starts_at, n.ends_at)
+        if t is not None and t > now
+    ]
+    timeout = min(math.ceil((min(changes) - now).total_seconds()), MAX_TIMEOUT) if changes else MAX_TIMEOUT
+    fragment = {
+        'html': mark_safe(html),
+        'etag': f'"{hashlib.md5(html.encode()).hexdigest()}"',
+    }
+    return fragment, timeout
+
+
+def get():
+    key = FRAGMENT_KEY.format(generation())
+    fragment = cache.get(key)
+    metrics.cache_lookup('ticker', fragment is not None)
+    if fragment is None:
+        fragment, timeout = render()
+        cache.set(key, fragment, timeout)
+    return fragment
+
+
+async def aget():
+    key = FRAGMENT_KEY.format(await ageneration())
+    fragment = await cache.aget(key)
+    metrics.cache_lookup('ticker', fragment is not None)
+    if fragment is None:
+        fragment, timeout = await sync_to_async(render)()
+        await cache.aset(key, fragment, timeout)
+    return fragment
+
+
+def invalidate():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
@@ -9,8 +9,18 @@ urlpatterns = [
     path('about/', views.about, name='about'),
     path('contact/', views.contact, name='contact'),
     path('admin/', views.admin_panel, name='admin_panel'),
+    path('admin/sections/<str:section>/', views.admin_section, name='admin_section'),
+    path('admin/reply-jobs/<str:job_id>/', views.admin_reply_job, name='admin_reply_job'),
     path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin/analytics/speed-tests/', views.admin_speed_test_analytics, name='admin_speed_test_analytics'),
     path('dashboard/', views.admin_dashboard, name='dashboard'),
     path('home-speed-test/', views.home_speed_test, name='home_speed_test'),
+    path('home-speed-test/<str:job_id>/', views.home_speed_test_status, name='home_speed_test_status'),
+    path('speed-test/ping/', views.speed_test_ping, name='speed_test_ping'),
+    path('speed-test/download/', views.speed_test_download, name='speed_test_download'),
+    path('speed-test/upload/', views.speed_test_upload, name='speed_test_upload'),
+    path('speed-test/result/', views.speed_test_result, name='speed_test_result'),
     path('faq/', views.faq, name='faq'),
+    path('news-ticker/', views.news_ticker_fragment, name='news_ticker'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
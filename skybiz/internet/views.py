@@ -1,49 +1,81 @@
 from django.shortcuts import render, redirect
+from django.template import TemplateSyntaxError
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User,Group
+from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
-from django.core.mail import send_mail
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
-from twilio.rest import Client
+from django.core.cache import cache
+from django.db import transaction
 from .models import Package, ContactMessage, BusinessQuoteRequest, UserProfile, SpeedTestResult, Branch, NewsTicker
 from .forms import AdminLoginForm, AdminRegistrationForm, BranchForm
-from django.db.models import Avg
-from datetime import timedelta
+from . import analytics, catalog, db_pool, mailer, metrics, outbox, profiling, purge, rollups, ticker
+from .admin_sections import SECTIONS, decode_cursor
+from .page_cache import page_cache
+from .ratelimit import DECISIONS, client_ip, ratelimit, too_many_requests, stats as ratelimit_stats
+from .speedtest_jobs import enqueue_speed_test, get_job, QueueFull
+from .speedtest_native import MAX_DOWNLOAD_SIZE, drain_upload, stream_payload
+from datetime import date, timedelta
 from django.utils import timezone
 import logging
-import speedtest
 from django.views.decorators.csrf import csrf_exempt
-
-# Ensure user groups exist
-Group.objects.get_or_create(name='Staff')
-Group.objects.get_or_create(name='User')
+from django.views.decorators.http import condition
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+MAX_CHART_DAYS = 366
+
+@page_cache(csrf=True)
 def home(request):
-    popular_packages = Package.objects.filter(is_popular=True)[:12]
+    popular_packages = catalog.get().popular[:12]
     return render(request, 'home.html', {
         'popular_packages': popular_packages,
+        'speedtest_mode': settings.SPEEDTEST_MODE,
     })
 
+@page_cache
 def packages(request):
-    residential_packages = Package.objects.filter(package_type='residential')
-    business_packages = Package.objects.filter(package_type='business')
+    current = catalog.get()
     return render(request, 'packages.html', {
-        'residential_packages': residential_packages,
-        'business_packages': business_packages
+        'residential_packages': current.residential,
+        'business_packages': current.business
     })
 
+@page_cache
 def services(request):
     return render(request,'services.html')
 
-def news_ticker(request):
-    news = NewsTicker.objects.filter(is_active=True)
-    return {'news_ticker': news}
+@condition(etag_func=lambda request: ticker.get()['etag'])
+def news_ticker_fragment(request):
+    # The ticker fragment on its own, for clients refreshing it in place
+    return HttpResponse(ticker.get()['html'])
+
+def metrics_view(request):
+    # Prometheus scrape endpoint, see internet/metrics.py
+    token = settings.METRICS_TOKEN
+    if not (client_ip(request) in settings.METRICS_ALLOWED_IPS
+            or token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        return HttpResponse(status=403)
+    limits = ratelimit_stats()
+    slots = limits['speedtest_slots']
+    body = metrics.render([
+        ('skybiz_ratelimit_decisions_total', 'counter', 'Rate limit decisions by endpoint, from the shared cache.', [
+            ((('endpoint', name), ('decision', decision)), counts[decision])
+            for name, counts in limits.items() for decision in DECISIONS
+        ]),
+        ('skybiz_speedtest_slots_in_use', 'gauge', 'Global server-side speed test slots taken.', [((), slots['in_use'])]),
+        ('skybiz_speedtest_slots_limit', 'gauge', 'SPEEDTEST_GLOBAL_CONCURRENCY.', [((), slots['limit'])]),
+    ])
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
 
+@ratelimit('business')
+@page_cache(csrf=True)
 def business(request):
     if request.method == 'POST':
         company_name = request.POST.get('company_name')
@@ -66,9 +98,11 @@ def business(request):
     
     return render(request, 'business.html')
 
+@page_cache
 def about(request):
     return render(request, 'about.html')
 
+@ratelimit('contact')
 def contact(request):
     if request.method == 'POST':
         name = request.POST.get('name')
@@ -76,78 +110,113 @@ def contact(request):
         phone = request.POST.get('phone')
         subject = request.POST.get('subject')
         message = request.POST.get('message')
+        to = outbox.normalize_phone(phone)
+        if phone and not to:
+            logger.warning(f"Contact message from {email} has an unusable phone number, not sending WhatsApp: {phone[:50]!r}")
         
-        # Save to database (without phone field)
-        ContactMessage.objects.create(
-            name=name,
-            email=email,
-            subject=subject,
-            message=message
-        )
-        if phone:
-            try:
-                # Send WhatsApp message via Twilio
-                twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-                whatsapp_message = f"New contact message from {name} ({email}, {phone}): {message}"
-                twilio_client.messages.create(
-                    body=whatsapp_message,
-                    from_=f'whatsapp:{settings.TWILIO_WHATSAPP_NUMBER}',
-                    to=f'whatsapp:{phone}'
+        # Save to database (without phone field); the WhatsApp notification
+        # is queued in the same transaction and sent after commit
+        with transaction.atomic():
+            contact_message = ContactMessage.objects.create(
+                name=name,
+                email=email,
+                subject=subject,
+                message=message
+            )
+            if to:
+                outbox.enqueue(
+                    to=to,
+                    body=f"New contact message from {name} ({email}, {to}): {message}",
+                    contact_message=contact_message,
                 )
-                logger.info(f"WhatsApp message sent to {phone}")
-            except Exception as e:
-                logger.error(f"Failed to send WhatsApp message: {str(e)}")
-                messages.error(request, f"Failed to send WhatsApp message: {str(e)}")
-                return redirect('contact')
-        # Only mail feature enabled, WhatsApp feature is temporarily disabled
+                transaction.on_commit(outbox.kick)
         messages.success(request, 'Thank you for your message! We will get back to you soon.')
         return redirect('contact')
     branches = Branch.objects.filter(is_active=True)
     return render(request, 'contact.html',{'branches': branches})
 
 @csrf_exempt
+@ratelimit('home_speed_test', json=True)
 def home_speed_test(request):
     if request.method == 'POST':
         try:
-            # Import inside function - critical fix for some hosting environments
-            s = speedtest.Speedtest()
-            s.get_servers()
-            s.get_best_server()
-            
-            # Fast test - only 8-12 seconds
-            download = round(s.download() / 1_000_000, 2)
-            upload = round(s.upload() / 1_000_000, 2)
-            ping = round(s.results.ping, 1)
-            
-            server = s.results.server
-            
-            # Save result
-            SpeedTestResult.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                download_speed=download,
-                upload_speed=upload,
-                latency=ping,
+            job_id = enqueue_speed_test(
+                user_id=request.user.id if request.user.is_authenticated else None,
                 ip_address=request.META.get('REMOTE_ADDR', 'Unknown')
             )
-            
-            return JsonResponse({
-                'success': True,
-                'download': download,
-                'upload': upload,
-                'ping': ping,
-                'server': server.get('sponsor', 'Local Server'),
-                'location': f"{server.get('name', '')}, {server.get('country', '')}"
-            })
-            
-        except Exception as e:
-            logger.error(f"Speed test failed: {e}")
-            return JsonResponse({
-                'success': False,
-                'error': 'No internet connection detected'
-            })
+        except QueueFull:
+            return too_many_requests(settings.SPEEDTEST_RETRY_AFTER, json=True)
+
+        return JsonResponse({
+            'success': True,
+            'job_id': job_id,
+            'status_url': reverse('home_speed_test_status', args=[job_id])
+        }, status=202)
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+def home_speed_test_status(request, job_id):
+    job = get_job(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Unknown speed test'}, status=404)
+    return JsonResponse(job)
+
+# Native (browser measured) speed test endpoints
+def speed_test_ping(request):
+    response = HttpResponse(status=204)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+def speed_test_download(request):
+    try:
+        size = int(request.GET.get('size', 25 * 1024 * 1024))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid size'}, status=400)
+    if size < 0:
+        return JsonResponse({'error': 'Invalid size'}, status=400)
+    size = min(size, MAX_DOWNLOAD_SIZE)
+    response = StreamingHttpResponse(stream_payload(size), content_type='application/octet-stream')
+    response['Content-Length'] = str(size)
+    response['Cache-Control'] = 'no-store'
+    # Keep GZipMiddleware and proxies from touching the payload
+    response['Content-Encoding'] = 'identity'
+    return response
+
+@csrf_exempt
+@ratelimit('speed_test_upload', json=True)
+def speed_test_upload(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    received = drain_upload(request)
+    if received is None:
+        return JsonResponse({'error': 'Upload too large'}, status=413)
+    response = JsonResponse({'received': received})
+    response['Cache-Control'] = 'no-store'
+    return response
+
+@ratelimit('speed_test_result', json=True)
+def speed_test_result(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    try:
+        download = round(float(request.POST.get('download')), 2)
+        upload = round(float(request.POST.get('upload')), 2)
+        ping = round(float(request.POST.get('ping')), 1)
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid result'}, status=400)
+    if not (0 <= download <= 100_000 and 0 <= upload <= 100_000 and 0 <= ping <= 60_000):
+        return JsonResponse({'success': False, 'error': 'Invalid result'}, status=400)
+
+    SpeedTestResult.objects.create(
+        user=request.user if request.user.is_authenticated else None,
+        download_speed=download,
+        upload_speed=upload,
+        latency=ping,
+        ip_address=request.META.get('REMOTE_ADDR', 'Unknown')
+    )
+    return JsonResponse({'success': True, 'download': download, 'upload': upload, 'ping': ping})
+
+@page_cache
 def faq(request):
     return render(request, 'faq.html')
 
@@ -319,42 +388,49 @@ def admin_panel(request):#Admin_panel feature
                 messages.error(request, 'Package not found.')
 
         elif action =='delete_all_messages':
-            if request.method == "POST":
-               action = request.POST.get("action")
-            # ...existing code...
-            if action == "delete_all_messages":
-                   ContactMessage.objects.all().delete()
-                   messages.success(request, "All contact messages have been deleted.")
-            return redirect("admin_panel")
-    # ...existing code...
+            deleted = purge.purge(ContactMessage.objects.all())
+            messages.success(request, f"All contact messages have been deleted ({deleted}).")
+            return redirect(reverse('admin_panel') + '#messages')
         
         elif action == 'send_reply':
             message_id = request.POST.get('message_id')
             reply_text = request.POST.get('reply_text')
             try:
-                message = ContactMessage.objects.get(id=message_id)
+                message = ContactMessage.objects.only('id', 'email', 'subject').get(id=message_id)
                 if not reply_text:
                     messages.error(request, 'Reply text cannot be empty.')
                 else:
-                    subject = f"Re: {message.subject}"
-                    from_email = settings.DEFAULT_FROM_EMAIL
-                    recipient_list = [message.email]
-                    try:
-                        send_mail(
-                            subject=subject,
-                            message=reply_text,
-                            from_email=from_email,
-                            recipient_list=recipient_list,
-                            fail_silently=False,
-                        )
-                        message.reply_sent = True
-                        message.save()
-                        messages.success(request, f'Reply sent successfully to {message.email}.')
-                    except Exception as e:
-                        messages.error(request, f'Failed to send reply: {str(e)}')
+                    job_id = mailer.start_replies([message.id], f"Re: {message.subject}", reply_text)
+                    messages.success(request, f'Sending reply to {message.email}.')
+                    return redirect(f"{reverse('admin_panel')}?reply_job={job_id}#messages")
             except ContactMessage.DoesNotExist:
                 messages.error(request, 'Message not found.')
-            return redirect('admin_panel')
+            return redirect(f"{reverse('admin_panel')}#messages")
+
+        elif action == 'bulk_reply':
+            try:
+                message_ids = [int(message_id) for message_id in request.POST.getlist('message_ids')]
+            except ValueError:
+                messages.error(request, 'Invalid message selection.')
+                return redirect(f"{reverse('admin_panel')}#messages")
+            # Only messages that still exist are replied to and counted
+            message_ids = list(ContactMessage.objects.filter(id__in=message_ids).values_list('id', flat=True))
+            subject = request.POST.get('subject') or 'Re: {{ subject }}'
+            reply_text = request.POST.get('reply_text')
+            if not message_ids:
+                messages.error(request, 'Select at least one message to reply to.')
+            elif not reply_text:
+                messages.error(request, 'Reply text cannot be empty.')
+            else:
+                try:
+                    subject, body = mailer.compile_reply(subject, reply_text)
+                except TemplateSyntaxError as e:
+                    messages.error(request, f'Invalid reply template: {str(e)}')
+                else:
+                    job_id = mailer.start_replies(message_ids, subject, body)
+                    messages.success(request, f'Sending {len(message_ids)} replies.')
+                    return redirect(f"{reverse('admin_panel')}?reply_job={job_id}#messages")
+            return redirect(f"{reverse('admin_panel')}#messages")
         
         # elif action == 'add_carousel':
         #     if request.user.is_authenticated and request.user.is_staff:
@@ -412,8 +488,17 @@ def admin_panel(request):#Admin_panel feature
         #             messages.error(request, 'Carousel image not found.')
         #         return redirect('admin_panel')
         elif action == 'delete_all_speed_tests':
-                SpeedTestResult.objects.all().delete()
-                messages.success(request, 'All speed test results have been deleted.')
+                deleted = purge.purge(SpeedTestResult.objects.all(), update_rollups=False)
+                rollups.clear()
+                messages.success(request, f'All speed test results have been deleted ({deleted}).')
+                return redirect(reverse('admin_panel') + '#speed_tests')
+        elif action == 'apply_retention':
+                results = purge.apply_retention()
+                if results:
+                    summary = ', '.join(f'{count} {name.replace("_", " ")}' for name, count in results.items())
+                    messages.success(request, f'Retention policies applied, deleted {summary}.')
+                else:
+                    messages.error(request, 'No retention policies are configured.')
                 return redirect('admin_panel')
         elif action == 'add_branch':
             if request.user.is_authenticated and request.user.is_staff:
@@ -456,13 +541,17 @@ def admin_panel(request):#Admin_panel feature
         elif action == 'save_news':
             news_id = request.POST.get('news_id')
             message = request.POST.get('message')
+            starts_at = _parse_local_datetime(request.POST.get('starts_at'))
+            ends_at = _parse_local_datetime(request.POST.get('ends_at'))
             if news_id:
                 news = NewsTicker.objects.get(id=news_id)
                 news.message = message
+                news.starts_at = starts_at
+                news.ends_at = ends_at
                 news.save()
                 messages.success(request, 'News updated!')
             else:
-                NewsTicker.objects.create(message=message)
+                NewsTicker.objects.create(message=message, starts_at=starts_at, ends_at=ends_at)
                 messages.success(request, 'News added!')
                 return redirect('admin_panel')
         elif action == 'delete_news':
@@ -473,29 +562,83 @@ def admin_panel(request):#Admin_panel feature
 
         return redirect('admin_panel')
 
-    users = User.objects.all()
-    all_packages = Package.objects.all()
-    news_items = NewsTicker.objects.all()
-    messages_list = ContactMessage.objects.all()
-    business_requests = BusinessQuoteRequest.objects.all()
-    speed_test_results = SpeedTestResult.objects.all()
-    # carousel_images = CarouselImage.objects.all().order_by('-created_at')
-    branches = Branch.objects.all().order_by('-created_at')
-    # image_upload_form = ImageUploadForm()
+    # Section tables are fetched lazily from admin_section
     branch_form = BranchForm()
     return render(request, 'admin_panel.html', {
-        'users': users,
-        'all_packages': all_packages,
-        'messages': messages_list,
-        'news_ticker': news_items,
-        'business_requests': business_requests,
-        'speed_test_results': speed_test_results,
-        # 'carousel_images': carousel_images,
-        'branches': branches,
-        # 'image_upload_form': image_upload_form,
-        'branch_form': branch_form
+        'branch_form': branch_form,
+        'reply_job': request.GET.get('reply_job'),
     })
 
+@login_required
+def admin_reply_job(request, job_id):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'You must be an admin to access this page.'}, status=403)
+    job = mailer.get_job(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Unknown or expired job.'}, status=404)
+    return JsonResponse(job)
+
+@login_required
+def admin_section(request, section):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'You must be an admin to access this page.'}, status=403)
+    if section not in SECTIONS:
+        return JsonResponse({'error': 'Unknown section'}, status=404)
+
+    cursor = None
+    if request.GET.get('cursor'):
+        try:
+            cursor = decode_cursor(request.GET['cursor'])
+        except ValueError:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    rows, next_cursor = SECTIONS[section].page(cursor)
+    html = render_to_string(SECTIONS[section].template, {'rows': rows}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+@login_required
+def admin_speed_test_analytics(request):
+    # Percentiles for the dashboard charts, ?metric=&group=&start=&end=[&user=]
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'You must be an admin to access this page.'}, status=403)
+    metric = request.GET.get('metric', 'download_speed')
+    group = request.GET.get('group', 'day')
+    if metric not in analytics.METRICS or group not in analytics.GROUPS:
+        return JsonResponse({'error': 'Unknown metric or grouping'}, status=400)
+    try:
+        user_ids = [int(request.GET['user'])] if request.GET.get('user') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid user'}, status=400)
+    start, end = _chart_range(request)
+
+    key = f'analytics:{metric}:{group}:{start}:{end}:{user_ids}'
+    result = cache.get(key)
+    if result is None:
+        result = analytics.percentiles(metric, start, end, group, user_ids)
+        cache.set(key, result, settings.ANALYTICS_CACHE_TIMEOUT)
+    return JsonResponse(result)
+
+def _parse_local_datetime(value):
+    # datetime-local inputs post naive times in the site's time zone
+    parsed = parse_datetime(value) if value else None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def _chart_range(request):
+    # Chart range from ?start=YYYY-MM-DD&end=YYYY-MM-DD, last 7 days by default
+    today = timezone.localdate()
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=6)
+    except ValueError:
+        end, start = today, today - timedelta(days=6)
+    if start > end:
+        start, end = end, start
+    # Keep the chart readable
+    start = max(start, end - timedelta(days=MAX_CHART_DAYS - 1))
+    return start, end
+
 def admin_dashboard(request):#admin_dashboard feature
     login_form = AdminLoginForm()
     registration_form = AdminRegistrationForm()
@@ -608,21 +751,14 @@ def admin_dashboard(request):#admin_dashboard feature
         business_packages = Package.objects.filter(package_type='business').count()
         recent_messages = ContactMessage.objects.order_by('-created_at')[:2]
         recent_business_requests = BusinessQuoteRequest.objects.order_by('-created_at')[:2]
-        recent_speed_tests = SpeedTestResult.objects.order_by('-timestamp')[:2]
-        speed_tests_total = SpeedTestResult.objects.count()
-        avg_download_speed = SpeedTestResult.objects.aggregate(avg_download=Avg('download_speed'))['avg_download'] or 0
-        avg_upload_speed = SpeedTestResult.objects.aggregate(avg_upload=Avg('upload_speed'))['avg_upload'] or 0
-        avg_latency = SpeedTestResult.objects.aggregate(avg_latency=Avg('latency'))['avg_latency'] or 0
-        today = timezone.now().date()
-        chart_labels = []
-        chart_data = []
-        for i in range(6, -1, -1):
-            day = today - timedelta(days=i)
-            chart_labels.append(day.strftime('%Y-%m-%d'))
-            avg_speed = SpeedTestResult.objects.filter(
-                timestamp__date=day
-            ).aggregate(avg_download=Avg('download_speed'))['avg_download'] or 0
-            chart_data.append(round(avg_speed, 2))
+        recent_speed_tests = SpeedTestResult.objects.select_related('user').order_by('-timestamp')[:2]
+        speed_totals = rollups.totals()
+        speed_tests_total = speed_totals['count']
+        avg_download_speed = speed_totals['avg_download']
+        avg_upload_speed = speed_totals['avg_upload']
+        avg_latency = speed_totals['avg_latency']
+        chart_start, chart_end = _chart_range(request)
+        chart_labels, chart_data = rollups.daily_series(chart_start, chart_end)
 
         context.update({
             'total_users': total_users,
@@ -640,6 +776,11 @@ def admin_dashboard(request):#admin_dashboard feature
             'avg_latency': round(avg_latency, 2),
             'chart_labels': chart_labels,
             'chart_data': chart_data,
+            'chart_start': chart_start,
+            'chart_end': chart_end,
+            'db_pool': db_pool.stats(),
+            'rate_limits': ratelimit_stats(),
+            'slow_requests': profiling.slowest(),
         })
 
     return render(request, 'admin_dashboard.html', context)
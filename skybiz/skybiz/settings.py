@@ -31,7 +31,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'internet.middleware.MetricsMiddleware',
+    'internet.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'internet.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -44,12 +47,23 @@ ROOT_URLCONF = 'skybiz.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for the profiling middleware
+        'BACKEND': 'internet.profiling.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIRS],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Explicit so templates stay compiled in memory between requests
+            # even if more loaders are added later; runserver still reloads
+            # them when a template changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
-                # 'internet.context_processors.news_ticker',
+                'internet.context_processors.news_ticker',
+                'internet.context_processors.page_cache_csrf',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
@@ -71,9 +85,31 @@ DATABASES = {
         'PASSWORD': 'admin',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Test reused connections before handing them to a request
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Connection pool per worker process (psycopg 3 with psycopg[pool]).
+# max_size caps the Postgres connections one worker can hold, max_idle
+# closes connections unused for that many seconds and timeout is how long
+# a request waits for a free connection before failing.
+DATABASE_POOL = {
+    'min_size': 2,
+    'max_size': 10,
+    'max_idle': 300,
+    'timeout': 10,
+}
+try:
+    # Django only pools with psycopg 3, and uses it over psycopg2 when both are installed
+    import psycopg  # noqa: F401
+    import psycopg_pool  # noqa: F401
+except ImportError:
+    # psycopg2 has no pool; keep connections open between requests instead
+    DATABASES['default']['CONN_MAX_AGE'] = DATABASE_POOL['max_idle']
+else:
+    DATABASES['default']['OPTIONS'] = {'pool': DATABASE_POOL}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -111,11 +147,136 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [STATIC_DIRS]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# collectstatic fingerprints and precompresses assets for production;
+# development serves them straight from static/
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'internet.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Tailwind v3 standalone CLI used by `manage.py build_assets` (path or name on PATH)
+ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+TAILWIND_CLI = os.environ.get('TAILWIND_CLI', 'tailwindcss')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Per-request query accounting. The header is for development only.
+QUERY_BUDGET_HEADER = DEBUG
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGETS = {
+    'admin_panel': 5,
+    'admin_section': 5,
+    'admin_dashboard': 14,
+    'dashboard': 14,
+}
+
+# Request profiling (internet/profiling.py). Server-Timing is for development
+# only; staff can always capture a cProfile with ?_profile=cumulative
+PROFILING_HEADER = DEBUG
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0.05'))
+PROFILING_BUFFER_SIZE = 200
+PROFILING_QUERY_PARAM = '_profile'
+PROFILING_LINES = 60
+
+# Seconds the speed test percentile API (internet/analytics.py) reuses a result
+ANALYTICS_CACHE_TIMEOUT = 60
+
+# Prometheus metrics (internet/metrics.py). Every worker writes its totals to
+# METRICS_DIR, which should be emptied when the service starts. /metrics/
+# answers METRICS_ALLOWED_IPS, or anyone sending "Authorization: Bearer
+# <METRICS_TOKEN>" when it is set.
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(BASE_DIR, '.metrics'))
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Days to keep old rows before purge_data / "Apply Retention" deletes them
+RETENTION_DAYS = {
+    'speed_tests': 365,
+    'messages': 730,
+    'business_requests': 730,
+}
+
+# Runs the tests against locmem caches instead of the shared ones below
+TEST_RUNNER = 'internet.testing.TestRunner'
+
+# Cache shared by all worker processes on this host (speed test jobs, rate
+# limit buckets, speed test slots, outbox state). Culling drops entries at
+# random, so keep MAX_ENTRIES well above what it holds
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10_000},
+    },
+    # Full pages (internet/page_cache.py), apart so culling them never
+    # evicts anything from the default cache
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache', 'pages'),
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    # Profiling ring buffer (internet/profiling.py), with room for every slot
+    'profiling': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache', 'profiling'),
+        'OPTIONS': {'MAX_ENTRIES': PROFILING_BUFFER_SIZE * 2},
+    },
+    # Per-process cache for the {% cache %} fragments in base.html; they only
+    # change on deploy, which restarts the workers
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+    },
+}
+
+# Seconds anonymous pages stay in the page cache; edits invalidate sooner
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# asgi.py turns this on so the public read pages use internet/async_views.py
+ASYNC_PUBLIC_VIEWS = os.environ.get('SKYBIZ_ASYNC_VIEWS') == '1'
+
+# Token buckets per client IP: view name -> (requests, per seconds)
+RATE_LIMITS = {
+    'home_speed_test': (3, 10 * 60),
+    'speed_test_upload': (24, 10 * 60),  # four upload streams per test
+    'speed_test_result': (6, 10 * 60),
+    'contact': (5, 10 * 60),
+    'business': (5, 10 * 60),
+}
+# Reverse proxies in front of the site that append to X-Forwarded-For;
+# 0 uses REMOTE_ADDR
+RATE_LIMIT_PROXY_COUNT = 0
+
+# 'native' measures the visitor's line in the browser against this server,
+# 'server' runs speedtest-cli from the server in a background job
+SPEEDTEST_MODE = 'native'
+SPEEDTEST_PAYLOAD_SIZE = 8 * 1024 * 1024
+
+# Speed tests run in a background pool, at most this many at once per worker
+SPEEDTEST_MAX_CONCURRENCY = 2
+SPEEDTEST_MAX_QUEUED = 10
+# Server-side speed tests admitted at once across all workers, each slot
+# held for at most SPEEDTEST_SLOT_LEASE seconds; rejected clients retry later
+SPEEDTEST_GLOBAL_CONCURRENCY = 4
+SPEEDTEST_SLOT_LEASE = 5 * 60
+SPEEDTEST_RETRY_AFTER = 30
+# How long the discovered speedtest.net server list and best server stay fresh
+SPEEDTEST_SERVER_CACHE_TTL = 6 * 60 * 60
+
+# Speed tests older than this are moved to compressed monthly files by
+# archive_speedtests (keep it below the speed_tests retention period)
+SPEEDTEST_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive', 'speedtests')
+SPEEDTEST_ARCHIVE_AFTER_DAYS = 180
+
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -126,4 +287,5 @@ DEFAULT_FROM_EMAIL = 'mirpur.skcn@gmail.com'
 TWILIO_ACCOUNT_SID = 'your-twilio-account-sid'
 TWILIO_AUTH_TOKEN = 'your-twilio-auth-token'
 TWILIO_WHATSAPP_NUMBER = '01883005575'  # Your Twilio WhatsApp number
+TWILIO_API_BASE = 'https://api.twilio.com'
 ADMIN_WHATSAPP_NUMBER = 'whatsapp:+8801883005575' # Admin's WhatsApp number
\ No newline at end of file
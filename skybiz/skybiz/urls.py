@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from internet import assets
 
 urlpatterns = [
     path('admin_developer/', admin.site.urls),
-    path('', include('internet.urls')),
-]
\ No newline at end of file
+    path('', include('internet.async_urls' if settings.ASYNC_PUBLIC_VIEWS else 'internet.urls')),
+]
+
+if not settings.DEBUG:
+    # Collected assets with precompressed variants and immutable caching
+    urlpatterns.append(re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.*)$', assets.serve))
@@ -0,0 +1,101 @@
+// Browser based speed test against this server.
+// Measures the visitor's own line: ping, download and upload throughput.
+const SkybizSpeedTest = (() => {
+    const STREAMS = 4;
+    const DOWNLOAD_BYTES = 25 * 1024 * 1024;
+    const UPLOAD_BYTES = 8 * 1024 * 1024;
+    const PING_COUNT = 8;
+
+    function now() {
+        return performance.now();
+    }
+
+    function toMbps(bytes, ms) {
+        return Math.round((bytes * 8 / (ms / 1000) / 1000000) * 100) / 100;
+    }
+
+    async function measurePing(url) {
+        const samples = [];
+        for (let i = 0; i < PING_COUNT; i++) {
+            const start = now();
+            await fetch(`${url}?n=${i}-${Date.now()}`, {cache: 'no-store'});
+            samples.push(now() - start);
+        }
+        // First request pays for connection setup, use the median of the rest
+        samples.shift();
+        samples.sort((a, b) => a - b);
+        return Math.round(samples[Math.floor(samples.length / 2)] * 10) / 10;
+    }
+
+    async function downloadStream(url, bytes, onBytes) {
+        const response = await fetch(`${url}?size=${bytes}&n=${Math.random()}`, {cache: 'no-store'});
+        const reader = response.body.getReader();
+        while (true) {
+            const {done, value} = await reader.read();
+            if (done) break;
+            onBytes(value.length);
+        }
+    }
+
+    async function measureDownload(url, onProgress) {
+        let received = 0;
+        const total = DOWNLOAD_BYTES * STREAMS;
+        const start = now();
+        const streams = [];
+        for (let i = 0; i < STREAMS; i++) {
+            streams.push(downloadStream(url, DOWNLOAD_BYTES, n => {
+                received += n;
+                onProgress(received / total);
+            }));
+        }
+        await Promise.all(streams);
+        return toMbps(received, now() - start);
+    }
+
+    function randomBlob(bytes) {
+        // getRandomValues fills at most 64 KiB per call
+        const block = new Uint8Array(65536);
+        crypto.getRandomValues(block);
+        const parts = [];
+        for (let sent = 0; sent < bytes; sent += block.length) {
+            parts.push(block);
+        }
+        return new Blob(parts);
+    }
+
+    async function measureUpload(url, csrfToken, onProgress) {
+        const body = randomBlob(UPLOAD_BYTES);
+        const start = now();
+        let done = 0;
+        const streams = [];
+        for (let i = 0; i < STREAMS; i++) {
+            streams.push(fetch(url, {
+                method: 'POST',
+                body: body,
+                headers: {'X-CSRFToken': csrfToken, 'Content-Type': 'application/octet-stream'},
+            }).then(() => onProgress(++done / STREAMS)));
+        }
+        await Promise.all(streams);
+        return toMbps(body.size * STREAMS, now() - start);
+    }
+
+    async function run(config, onProgress = () => {}) {
+        onProgress('ping', 0);
+        const ping = await measurePing(config.pingUrl);
+        const download = await measureDownload(config.downloadUrl, p => onProgress('download', p));
+        const upload = await measureUpload(config.uploadUrl, config.csrfToken, p => onProgress('upload', p));
+
+        const form = new FormData();
+        form.append('download', download);
+        form.append('upload', upload);
+        form.append('ping', ping);
+        const response = await fetch(config.resultUrl, {
+            method: 'POST',
+            body: form,
+            headers: {'X-CSRFToken': config.csrfToken},
+        });
+        return response.json();
+    }
+
+    return {run};
+})();